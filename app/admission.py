@@ -0,0 +1,201 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+
+from app.config import (
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_ROUTE_LIMITS,
+    ADMISSION_TOTAL_CONCURRENCY,
+    USER_RATE_LIMIT,
+    USER_RATE_BURST,
+)
+
+
+class RouteLimiter:
+    """Ограничивает число одновременных запросов к одному маршруту.
+
+    Запросы сверх лимита ждут в очереди ограниченной длины. Если очередь
+    заполнена или ожидание длится дольше queue_timeout, запрос сразу
+    получает 503 вместо того, чтобы ждать соединение из пула.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def _reject(self):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is overloaded, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout)))}
+        )
+
+    async def acquire(self, timeout: Optional[float] = None):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                self._reject()
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(),
+                    max(0.0, timeout if timeout is not None else self.queue_timeout)
+                )
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                self._reject()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class UserRateLimiter:
+    """Token bucket на каждого пользователя (ключ — sub из JWT)."""
+
+    def __init__(self, rate: float, burst: int, max_users: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: OrderedDict[int, tuple[float, float]] = OrderedDict()
+        self.rejected = 0
+
+    def consume(self, user_id: int) -> float:
+        """Списывает токен. Возвращает 0 или сколько секунд ждать до следующего."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens >= 1:
+            self._buckets[user_id] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self._buckets[user_id] = (tokens, now)
+            self.rejected += 1
+            wait = (1 - tokens) / self.rate
+
+        # Самые давно неактивные пользователи вытесняются первыми:
+        # их корзины к этому моменту всё равно заполнены до burst
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tracked_users": len(self._buckets),
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionController:
+    """Лимиты по маршрутам и общий лимит процесса.
+
+    Лимит маршрута по умолчанию равен размеру пула, и без общего лимита
+    несколько нагруженных маршрутов вместе держали бы намного больше
+    запросов, чем в пуле соединений. Запрос сначала проходит лимит своего
+    маршрута, затем общий; ожидание в обеих очередях вместе не дольше
+    ADMISSION_QUEUE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.enabled = ADMISSION_ENABLED
+        self.limiters: dict[str, Optional[RouteLimiter]] = {}
+        self.total = RouteLimiter(ADMISSION_TOTAL_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+        self.users = UserRateLimiter(USER_RATE_LIMIT, USER_RATE_BURST)
+
+    def limiter_for(self, route_key: str) -> Optional[RouteLimiter]:
+        if route_key not in self.limiters:
+            limit = ADMISSION_ROUTE_LIMITS.get(route_key, ADMISSION_MAX_CONCURRENCY)
+            # null в ADMISSION_ROUTE_LIMITS снимает ограничение с маршрута
+            self.limiters[route_key] = (
+                RouteLimiter(limit, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+                if limit is not None else None
+            )
+        return self.limiters[route_key]
+
+    def check_user(self, user_id: int):
+        if not self.enabled:
+            return
+        wait = self.users.consume(user_id)
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "total": self.total.stats(),
+            "routes": {
+                key: limiter.stats()
+                for key, limiter in self.limiters.items() if limiter is not None
+            },
+            "users": self.users.stats(),
+        }
+
+
+admission = AdmissionController()
+
+
+async def admission_control(request: Request):
+    if not admission.enabled:
+        yield
+        return
+
+    route = request.scope.get("route")
+    route_key = f"{request.method} {route.path if route else request.url.path}"
+    limiter = admission.limiter_for(route_key)
+    if limiter is None:
+        yield
+        return
+
+    started = time.monotonic()
+    await limiter.acquire()
+    try:
+        await admission.total.acquire(limiter.queue_timeout - (time.monotonic() - started))
+    except BaseException:
+        limiter.release()
+        raise
+    try:
+        yield
+    finally:
+        admission.total.release()
+        limiter.release()
@@ -1,35 +1,61 @@
-from fastapi import Depends, HTTPException, status
+import secrets
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from app.admission import admission
+from app.config import ADMIN_TOKEN
 from app.database import get_db
-from app.models import User
+from app.schemas.user import CurrentUser
 from app.auth.jwt_handler import decode_access_token
+from app.auth.revocation import revocation_filter
+from app.logs import bind_user
+from app.services.token_service import TokenService
 
 bearer_scheme = HTTPBearer(auto_error=True)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     db: AsyncSession = Depends(get_db)
-):
+) -> CurrentUser:
     token = credentials.credentials
 
     try:
         payload = decode_access_token(token)
-        user_id = int(payload.get("sub"))
+        user = CurrentUser(
+            id=int(payload.get("sub")),
+            username=payload.get("username"),
+            session_id=payload.get("sid")
+        )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication token"
         )
-    
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
 
-    if not user:
+    bind_user(user.id)
+
+    # Лимит проверяется до запроса в БД, чтобы не тратить соединение
+    admission.check_user(user.id)
+
+    # В БД идём только если сессия попала в фильтр отозванных
+    revoked = (
+        revocation_filter.might_be_revoked(user.session_id)
+        and await TokenService.is_session_revoked(db, user.session_id)
+    )
+    if revoked:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            detail="Session has been revoked"
         )
 
     return user
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
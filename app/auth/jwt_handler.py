@@ -1,24 +1,39 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
-from app.config import SECRET_KEY as ENV_SECRET_KEY
+from app.config import SECRET_KEY as ENV_SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 
 SECRET_KEY = ENV_SECRET_KEY 
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-def create_access_token(data: dict):
+def _create_token(data: dict, token_type: str, lifetime: timedelta):
     to_encode = data.copy()
-    expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    expire = datetime.now(timezone.utc) + lifetime
+    to_encode.update({"exp": expire, "type": token_type})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str):
+def create_access_token(data: dict):
+    return _create_token(data, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+def create_refresh_token(data: dict):
+    return _create_token(data, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+def _decode_token(token: str, token_type: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
+        payload = None
+
+    # Refresh-токен нельзя предъявить вместо access-токена и наоборот
+    if not payload or payload.get("type") != token_type:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
+    return payload
+
+def decode_access_token(token: str):
+    return _decode_token(token, "access")
+
+def decode_refresh_token(token: str):
+    return _decode_token(token, "refresh")
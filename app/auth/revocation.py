@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+
+from app.config import REVOCATION_REFRESH_INTERVAL, REVOCATION_FILTER_ERROR_RATE
+from app.database import async_session_maker
+from app.models import SessionRevocation
+
+logger = logging.getLogger(__name__)
+
+# Фильтр всегда рассчитан хотя бы на столько записей, чтобы не перестраивать
+# его под каждую новую отозванную сессию
+MIN_FILTER_CAPACITY = 1024
+
+
+class BloomFilter:
+    """Битовый массив с k хэшами: «нет» — точно нет, «есть» — возможно есть."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    """Bloom-фильтр отозванных сессий в памяти воркера.
+
+    Периодически перестраивается из таблицы session_revocations, где лежат
+    только сессии с ещё живыми access-токенами, поэтому фильтр маленький.
+    Попадание в фильтр проверяется точным запросом в БД, а если фильтр давно
+    не обновлялся (БД недоступна), проверяется каждый токен.
+    """
+
+    def __init__(self, refresh_interval: float, error_rate: float):
+        self.refresh_interval = refresh_interval
+        self.error_rate = error_rate
+        self.filter = BloomFilter(MIN_FILTER_CAPACITY, error_rate)
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def rebuild(self, session_ids: list[str]):
+        bloom = BloomFilter(max(len(session_ids) * 2, MIN_FILTER_CAPACITY), self.error_rate)
+        for session_id in session_ids:
+            bloom.add(session_id)
+        self.filter = bloom
+        self.loaded_at = time.monotonic()
+
+    async def refresh(self):
+        async with async_session_maker() as db:
+            await db.execute(delete(SessionRevocation).where(SessionRevocation.expires_at <= func.now()))
+            result = await db.execute(select(SessionRevocation.session_id))
+            session_ids = result.scalars().all()
+            await db.commit()
+        self.rebuild(session_ids)
+
+    def add(self, session_id: str):
+        # Отзыв виден в этом воркере сразу, в остальных — после их обновления
+        self.filter.add(session_id)
+
+    def might_be_revoked(self, session_id: str) -> bool:
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.refresh_interval * 3:
+            return True
+        return session_id in self.filter
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh session revocation filter")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+revocation_filter = RevocationFilter(REVOCATION_REFRESH_INTERVAL, REVOCATION_FILTER_ERROR_RATE)
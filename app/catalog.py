@@ -0,0 +1,148 @@
+"""Снимок публичного каталога для чтения без запросов в БД.
+
+Снимок — один файл: его строит один воркер хоста, а все воркеры открывают
+через mmap. Страницы файла лежат в page cache один раз на хост, а не копией
+в памяти каждого процесса. Формат (little-endian):
+
+    заголовок   4s magic "CAT1", H версия, H число колонок,
+                Q время сборки (unix, нс), Q отметка изменений источника,
+                I треков, I альбомов, I пользователей
+    колонки     на каждую из COLUMNS: Q смещение, Q размер в байтах
+    данные      колонки подряд, каждая выровнена на 8 байт
+
+Строки каждой таблицы отсортированы по id, поиск — двоичный поиск по колонке
+id. Строки лежат в общей куче UTF-8 (колонка strings), колонки *_title и
+user_name хранят смещения в ней: n + 1 значение, строка i — [off[i], off[i + 1]).
+Треки альбома хранятся так же: смещения album_tracks и id треков подряд.
+NULL кодируется нулём для album_id и -1 для duration.
+
+Новый снимок пишется во временный файл и подменяет старый через os.replace,
+поэтому читатель видит либо старую версию целиком, либо новую.
+"""
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+MAGIC = b"CAT1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHQQIII")
+COLUMN = struct.Struct("<QQ")
+ALIGNMENT = 8
+
+NO_ALBUM = 0
+NO_DURATION = -1
+
+COLUMNS = (
+    ("track_id", "<i4"),
+    ("track_album_id", "<i4"),
+    ("track_owner_id", "<i4"),
+    ("track_duration", "<i4"),
+    ("track_title", "<u8"),
+    ("album_id", "<i4"),
+    ("album_owner_id", "<i4"),
+    ("album_release_date", "<i4"),  # date.toordinal()
+    ("album_title", "<u8"),
+    ("album_tracks", "<u8"),
+    ("album_track_ids", "<i4"),
+    ("user_id", "<i4"),
+    ("user_name", "<u8"),
+    ("strings", "u1"),
+)
+
+
+class InvalidSnapshot(Exception):
+    pass
+
+
+def write_snapshot(path: Path, columns: dict[str, np.ndarray], source_mark: int):
+    """Записывает снимок атомарно: временный файл рядом и os.replace."""
+    arrays = [np.ascontiguousarray(columns[name], dtype=dtype) for name, dtype in COLUMNS]
+
+    layout = []
+    offset = HEADER.size + COLUMN.size * len(COLUMNS)
+    for array in arrays:
+        offset += -offset % ALIGNMENT
+        layout.append((offset, array.nbytes))
+        offset += array.nbytes
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(
+                MAGIC, FORMAT_VERSION, len(COLUMNS), time.time_ns(), source_mark,
+                len(columns["track_id"]), len(columns["album_id"]), len(columns["user_id"])
+            ))
+            for column_offset, size in layout:
+                f.write(COLUMN.pack(column_offset, size))
+            for (column_offset, _), array in zip(layout, arrays):
+                f.write(b"\0" * (column_offset - f.tell()))
+                f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class CatalogSnapshot:
+    """Снимок, открытый через mmap. Колонки — numpy-массивы поверх файла."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER.size:
+                raise InvalidSnapshot("Truncated header")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # По (устройство, inode) видно, что файл подменили новым снимком
+        self.identity = (stat.st_dev, stat.st_ino)
+
+        magic, version, column_count, built_at_ns, self.source_mark, *_ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or column_count != len(COLUMNS):
+            raise InvalidSnapshot("Unsupported catalog snapshot format")
+        self.built_at = built_at_ns / 1e9
+
+        self.columns: dict[str, np.ndarray] = {}
+        for i, (name, dtype) in enumerate(COLUMNS):
+            offset, size = COLUMN.unpack_from(self.mm, HEADER.size + i * COLUMN.size)
+            if offset + size > len(self.mm):
+                raise InvalidSnapshot(f"Column {name} is out of bounds")
+            itemsize = np.dtype(dtype).itemsize
+            self.columns[name] = np.frombuffer(self.mm, dtype=dtype, count=size // itemsize, offset=offset)
+        self._strings_offset = COLUMN.unpack_from(self.mm, HEADER.size + (len(COLUMNS) - 1) * COLUMN.size)[0]
+
+    def age(self) -> float:
+        return time.time() - self.built_at
+
+    def find(self, table: str, ids: Iterable[int]) -> list[tuple[int, int]]:
+        """Пары (id, номер строки) для тех id, что есть в снимке, в порядке ids."""
+        column = self.columns[f"{table}_id"]
+        wanted = np.fromiter(ids, dtype=np.int64)
+        if not len(column) or not len(wanted):
+            return []
+        positions = np.searchsorted(column, wanted)
+        positions = np.minimum(positions, len(column) - 1)
+        found = column[positions] == wanted
+        return list(zip(wanted[found].tolist(), positions[found].tolist()))
+
+    def text(self, column: str, position: int) -> str:
+        offsets = self.columns[column]
+        start = self._strings_offset + int(offsets[position])
+        end = self._strings_offset + int(offsets[position + 1])
+        return self.mm[start:end].decode()
+
+    def texts(self, column: str) -> list[str]:
+        offsets = self.columns[column].tolist()
+        base = self._strings_offset
+        mm = self.mm
+        return [mm[base + start:base + end].decode() for start, end in zip(offsets, offsets[1:])]
+
+    def album_track_ids(self, position: int) -> list[int]:
+        offsets = self.columns["album_tracks"]
+        return self.columns["album_track_ids"][int(offsets[position]):int(offsets[position + 1])].tolist()
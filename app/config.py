@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -5,3 +6,134 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 SECRET_KEY = os.getenv("SECRET_KEY")
+
+# Access-токен живёт недолго и проверяется без запроса в БД,
+# новая пара токенов выдаётся по одноразовому refresh-токену
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Фильтр отозванных сессий перечитывается раз в REVOCATION_REFRESH_INTERVAL секунд —
+# за это время отзыв доходит до всех воркеров
+REVOCATION_REFRESH_INTERVAL = float(os.getenv("REVOCATION_REFRESH_INTERVAL", "5"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.01"))
+
+# Лента изменений плейлистов (SSE): длина очереди подписчика, после переполнения
+# которой он отключается, интервал keepalive и максимальная длительность потока —
+# по умолчанию время жизни access-токена, после чего клиент переподключается
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+EVENT_KEEPALIVE_INTERVAL = float(os.getenv("EVENT_KEEPALIVE_INTERVAL", "15"))
+EVENT_STREAM_MAX_DURATION = float(os.getenv("EVENT_STREAM_MAX_DURATION", str(ACCESS_TOKEN_EXPIRE_MINUTES * 60)))
+
+# Надгробия удалённых объектов для /sync хранятся SYNC_TOMBSTONE_TTL_DAYS дней
+# (чистит python -m app.jobs.sync_tombstones). Клиент, не синхронизировавшийся
+# дольше, получает 410 и выполняет полную синхронизацию
+SYNC_TOMBSTONE_TTL_DAYS = int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", "30"))
+
+# При false воркер не мигрирует схему сам, а падает на старте,
+# если версия базы отстаёт (миграции запускаются отдельно перед деплоем)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+
+# Размер пула соединений одного процесса. Лаунчер run.py делит
+# общий бюджет соединений DB_POOL_BUDGET между воркерами
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Сколько подготовленных statement'ов asyncpg держит на одно соединение
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+# Долгие потоковые маршруты: ни дедлайн, ни лимит одновременных
+# запросов к ним не применяются, соединение с БД они не удерживают
+STREAMING_ROUTES = {
+    "GET /playlists/events": None,
+    "GET /playlists/{playlist_id}/events": None,
+    "PUT /tracks/{track_id}/audio": None,
+    "GET /tracks/{track_id}/audio": None,
+}
+
+# Защита от перегрузки: лимит одновременных запросов на маршрут,
+# длина очереди ожидания и сколько секунд запрос может в ней провести.
+# ADMISSION_ROUTE_LIMITS — JSON вида {"GET /tracks/": 8}, null снимает лимит.
+# ADMISSION_TOTAL_CONCURRENCY — общий лимит на все маршруты процесса, по размеру пула
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_TOTAL_CONCURRENCY = int(os.getenv("ADMISSION_TOTAL_CONCURRENCY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+ADMISSION_ROUTE_LIMITS = {
+    **STREAMING_ROUTES,
+    **json.loads(os.getenv("ADMISSION_ROUTE_LIMITS", "{}")),
+}
+
+# Token bucket на пользователя: запросов в секунду и размер всплеска
+USER_RATE_LIMIT = float(os.getenv("USER_RATE_LIMIT", "20"))
+USER_RATE_BURST = int(os.getenv("USER_RATE_BURST", "40"))
+
+# Токен для служебных эндпоинтов /admin (заголовок X-Admin-Token).
+# Если не задан, служебные эндпоинты недоступны
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Профилирование запросов (см. app/profiling.py): доля случайно выбранных запросов,
+# период снятия стеков в секундах, каталог и число хранимых профилей.
+# Запрос с заголовком X-Profile-Token, равным ADMIN_TOKEN, профилируется всегда
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Дедлайн запроса в секундах: общий, максимальный (для X-Request-Timeout)
+# и по маршрутам — JSON вида {"GET /albums/": 5}, null отключает дедлайн
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "10"))
+MAX_REQUEST_DEADLINE = float(os.getenv("MAX_REQUEST_DEADLINE", "60"))
+ROUTE_DEADLINES = {
+    **STREAMING_ROUTES,
+    **json.loads(os.getenv("ROUTE_DEADLINES", "{}")),
+}
+
+# Счётчики прослушиваний копятся в памяти воркера и сбрасываются в БД
+# не реже раза в PLAY_FLUSH_INTERVAL секунд — это и есть максимальное окно потерь,
+# пока БД доступна. После ошибки сброс повторяется с паузой до PLAY_FLUSH_MAX_BACKOFF
+# секунд, а буфер не растёт больше PLAY_FLUSH_MAX_PENDING треков
+PLAY_FLUSH_INTERVAL = float(os.getenv("PLAY_FLUSH_INTERVAL", "5"))
+PLAY_FLUSH_MAX_PENDING = int(os.getenv("PLAY_FLUSH_MAX_PENDING", "10000"))
+PLAY_FLUSH_MAX_BACKOFF = float(os.getenv("PLAY_FLUSH_MAX_BACKOFF", "60"))
+
+# Чарт пересчитывается раз в CHART_REFRESH_INTERVAL секунд
+CHART_SIZE = int(os.getenv("CHART_SIZE", "100"))
+CHART_REFRESH_INTERVAL = float(os.getenv("CHART_REFRESH_INTERVAL", "60"))
+
+# Хранилище аудиофайлов. Если задан MEDIA_ACCEL_REDIRECT_PREFIX, файл отдаёт
+# nginx через X-Accel-Redirect (sendfile), а приложение только проверяет доступ
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX")
+MAX_AUDIO_SIZE = int(os.getenv("MAX_AUDIO_SIZE", str(200 * 1024 * 1024)))
+
+# Публичный каталог (GET /tracks/, /tracks/{id}, /albums/, /albums/{id}) читается
+# из снимка на диске, общего для воркеров хоста через mmap (см. app/catalog.py).
+# Воркеры проверяют снимок раз в CATALOG_REFRESH_INTERVAL секунд, снимок старше
+# CATALOG_MAX_AGE секунд не используется — тогда каталог читается из БД.
+# Пересборка (полное чтение таблиц каталога) — не чаще раза в CATALOG_MIN_REBUILD_INTERVAL секунд
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT_ENABLED", "true").lower() == "true"
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "catalog/catalog.snap")
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "5"))
+CATALOG_MAX_AGE = float(os.getenv("CATALOG_MAX_AGE", "60"))
+CATALOG_MIN_REBUILD_INTERVAL = float(os.getenv("CATALOG_MIN_REBUILD_INTERVAL", "15"))
+
+# Списки больше COMPRESSION_MIN_SIZE байт сжимаются (brotli/gzip по Accept-Encoding).
+# Сжатые тела публичного каталога кэшируются в памяти воркера до COMPRESSED_CACHE_SIZE байт
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSED_CACHE_SIZE = int(os.getenv("COMPRESSED_CACHE_SIZE", str(32 * 1024 * 1024)))
+
+# Логи пишутся JSON-строками в stdout фоновым потоком (см. app/logs.py).
+# LOG_SAMPLE_RATES — доля записей каждой категории (sql, request, error, app),
+# которая попадает в лог; меняется без перезапуска через PUT /admin/logging.
+# При переполнении очереди на LOG_QUEUE_SIZE записей новые записи отбрасываются
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = {
+    "sql": 0.01,
+    "request": 1.0,
+    "error": 1.0,
+    "app": 1.0,
+    **json.loads(os.getenv("LOG_SAMPLE_RATES", "{}")),
+}
@@ -1,8 +1,17 @@
+import time
+
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from app.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_STATEMENT_CACHE_SIZE
+from app.deadline import request_deadline
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+)
 
 async_session_maker = sessionmaker(
     engine,
@@ -12,6 +21,21 @@ async_session_maker = sessionmaker(
 
 Base = declarative_base()
 
+# Таймаут передаётся параметром: текст запроса один и тот же, и asyncpg
+# не вытесняет из кэша подготовленных statement'ов запросы приложения
+SET_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :timeout, true)")
+
+
+@event.listens_for(Session, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    # Каждая транзакция запроса получает statement_timeout по оставшемуся
+    # до дедлайна времени, чтобы медленный запрос не держал соединение
+    deadline = request_deadline.get()
+    if deadline is None or connection.dialect.name != "postgresql":
+        return
+    remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+    connection.execute(SET_STATEMENT_TIMEOUT, {"timeout": str(remaining_ms)})
+
 async def get_db():
     async with async_session_maker() as session:
         yield session
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy.exc import DBAPIError
+from starlette.routing import Match
+
+from app.config import REQUEST_DEADLINE, MAX_REQUEST_DEADLINE, ROUTE_DEADLINES
+
+# Момент (по time.monotonic), к которому запрос должен завершиться
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+# SQLSTATE query_canceled: statement_timeout сработал на стороне БД
+QUERY_CANCELED = "57014"
+
+
+def remaining_seconds() -> Optional[float]:
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def route_key(scope) -> Optional[str]:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{scope['method']} {route.path}"
+    return None
+
+
+def resolve_timeout(scope) -> Optional[float]:
+    key = route_key(scope)
+    timeout = ROUTE_DEADLINES.get(key, REQUEST_DEADLINE) if key else REQUEST_DEADLINE
+    if timeout is None:
+        return None
+
+    for name, value in scope["headers"]:
+        if name == DEADLINE_HEADER:
+            try:
+                requested = float(value)
+            except ValueError:
+                break
+            if requested > 0:
+                timeout = requested
+            break
+
+    return min(timeout, MAX_REQUEST_DEADLINE)
+
+
+def has_body(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"transfer-encoding":
+            return True
+        if name == b"content-length":
+            return value.strip() not in (b"", b"0")
+    return False
+
+
+def is_deadline_error(exc: BaseException) -> bool:
+    return isinstance(exc, DBAPIError) and getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED
+
+
+class DeadlineMiddleware:
+    """Ограничивает время обработки запроса.
+
+    Дедлайн берётся из настроек маршрута или заголовка X-Request-Timeout и
+    сохраняется в request_deadline — по нему сессия выставляет statement_timeout.
+    По истечении дедлайна обработчик отменяется и клиент получает 504,
+    а при отключении клиента обработчик отменяется сразу.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = resolve_timeout(scope)
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = time.monotonic() + timeout
+        token = request_deadline.set(deadline)
+        try:
+            await self._run(scope, receive, send, deadline)
+        finally:
+            request_deadline.reset(token)
+
+    async def _run(self, scope, receive, send, deadline: float):
+        response_started = False
+        body_pending = has_body(scope)
+        empty_body_sent = False
+        disconnected = asyncio.Event()
+        watcher: Optional[asyncio.Task] = None
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    app_task.cancel()
+                    return
+
+        def start_watcher():
+            nonlocal watcher
+            if watcher is None:
+                watcher = asyncio.create_task(watch_disconnect())
+
+        async def wrapped_receive():
+            nonlocal body_pending, empty_body_sent
+            if body_pending:
+                message = await receive()
+                if message["type"] == "http.disconnect" or not message.get("more_body", False):
+                    body_pending = False
+                    start_watcher()
+                return message
+
+            if not empty_body_sent:
+                empty_body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def wrapped_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        app_task = asyncio.create_task(self.app(scope, wrapped_receive, wrapped_send))
+        if not body_pending:
+            start_watcher()
+
+        try:
+            done, _ = await asyncio.wait({app_task}, timeout=max(0.0, deadline - time.monotonic()))
+            if not done:
+                app_task.cancel()
+                await asyncio.gather(app_task, return_exceptions=True)
+                if not response_started and not disconnected.is_set():
+                    await self._send_timeout(send)
+                return
+
+            if app_task.cancelled():
+                # Клиент отключился — отвечать уже некому
+                return
+
+            exc = app_task.exception()
+            if exc is not None:
+                if not response_started and (is_deadline_error(exc) or time.monotonic() >= deadline):
+                    await self._send_timeout(send)
+                    return
+                raise exc
+        finally:
+            if not app_task.done():
+                app_task.cancel()
+                await asyncio.gather(app_task, return_exceptions=True)
+            if watcher is not None:
+                watcher.cancel()
+
+    @staticmethod
+    async def _send_timeout(send):
+        body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,198 @@
+"""Лента изменений плейлистов.
+
+Сервис плейлистов отправляет события через pg_notify в той же транзакции,
+что и само изменение, поэтому PostgreSQL доставит их только после коммита
+и сразу во все воркеры. В каждом воркере одно соединение слушает канал и
+раздаёт события подписчикам через EventHub. То же соединение слушает и
+служебные каналы, добавленные через add_channel.
+
+У каждого подписчика своя очередь ограниченной длины. Если клиент не успевает
+читать и очередь переполнилась, он отключается от хаба (eviction) и получает
+событие "resync": ему нужно перечитать плейлисты и переподключиться.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Optional
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from app.config import DATABASE_URL, EVENT_QUEUE_SIZE, EVENT_KEEPALIVE_INTERVAL, EVENT_STREAM_MAX_DURATION
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "playlist_events"
+
+# Пауза перед повторным подключением слушателя к БД
+RECONNECT_DELAY = 1.0
+
+# Через сколько миллисекунд EventSource переподключается после обрыва
+CLIENT_RETRY_MS = 3000
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def playlist_topic(playlist_id: int) -> str:
+    return f"playlist:{playlist_id}"
+
+
+class Subscriber:
+
+    def __init__(self, topics: list[str], queue_size: int):
+        self.topics = topics
+        self.queue: asyncio.Queue[Optional[str]] = asyncio.Queue(maxsize=queue_size)
+
+    async def get(self) -> Optional[str]:
+        """Следующее событие или None, если подписчик отключён от хаба."""
+        return await self.queue.get()
+
+
+class EventHub:
+    """Pub/sub внутри процесса: темы — строки, события — готовый JSON."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._topics: dict[str, set[Subscriber]] = defaultdict(set)
+        self.evictions = 0
+
+    def subscribe(self, topics: list[str]) -> Subscriber:
+        subscriber = Subscriber(topics, self.queue_size)
+        for topic in topics:
+            self._topics[topic].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for topic in subscriber.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def evict(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber)
+        self.evictions += 1
+        # Недоставленное уже не нужно — клиент всё равно перечитает состояние
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def publish(self, topics: list[str], event: str):
+        # Подписчик на несколько тем получает событие один раз
+        targets = set()
+        for topic in topics:
+            targets.update(self._topics.get(topic, ()))
+
+        for subscriber in targets:
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.evict(subscriber)
+
+    def evict_all(self):
+        subscribers = set()
+        for topic_subscribers in self._topics.values():
+            subscribers.update(topic_subscribers)
+        for subscriber in subscribers:
+            self.evict(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._topics),
+            "subscribers": len({s for subs in self._topics.values() for s in subs}),
+            "evictions": self.evictions,
+        }
+
+
+class PlaylistEventListener:
+    """Слушает канал PostgreSQL и передаёт события в хаб."""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self._task: Optional[asyncio.Task] = None
+        self._channels = {CHANNEL: self._dispatch}
+
+    def add_channel(self, channel: str, callback: Callable[[str], None]):
+        """Подписывает callback на payload канала. Вызывать до start()."""
+        self._channels[channel] = lambda connection, pid, channel, payload: callback(payload)
+
+    def _dispatch(self, connection, pid, channel, payload: str):
+        try:
+            event = json.loads(payload)
+            topics = [user_topic(event["owner_id"]), playlist_topic(event["playlist_id"])]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Malformed playlist event: %r", payload)
+            return
+        self.hub.publish(topics, payload)
+
+    async def _listen(self, first: bool):
+        url = make_url(DATABASE_URL).set(drivername="postgresql")
+        connection = await asyncpg.connect(url.render_as_string(hide_password=False))
+        closed = asyncio.get_running_loop().create_future()
+        connection.add_termination_listener(lambda _: closed.done() or closed.set_result(None))
+        try:
+            for channel, listener in self._channels.items():
+                await connection.add_listener(channel, listener)
+            if not first:
+                # Пока слушателя не было, события терялись: пусть клиенты перечитают состояние
+                self.hub.evict_all()
+            await closed
+        finally:
+            if not connection.is_closed():
+                await connection.close()
+
+    async def _run(self):
+        first = True
+        while True:
+            try:
+                await self._listen(first)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Playlist event listener failed, reconnecting")
+            first = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.hub.evict_all()
+
+
+async def event_stream(hub: EventHub, topics: list[str]):
+    """Поток Server-Sent Events для подписчика на темы."""
+    loop = asyncio.get_running_loop()
+    subscriber = hub.subscribe(topics)
+    deadline = loop.time() + EVENT_STREAM_MAX_DURATION
+    try:
+        yield f"retry: {CLIENT_RETRY_MS}\n\n"
+        while True:
+            timeout = min(EVENT_KEEPALIVE_INTERVAL, deadline - loop.time())
+            if timeout <= 0:
+                # Клиент переподключится со свежим токеном
+                return
+            try:
+                event = await asyncio.wait_for(subscriber.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if event is None:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            yield f"event: playlist\ndata: {event}\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+event_hub = EventHub(EVENT_QUEUE_SIZE)
+playlist_listener = PlaylistEventListener(event_hub)
@@ -0,0 +1,209 @@
+"""Пересчёт похожих треков по совместной встречаемости в плейлистах.
+
+Трек представлен бинарным вектором плейлистов, в которых он встречается.
+Похожесть — косинус между такими векторами. Матрица трек × плейлист
+разреженная, а произведение на транспонированную считается блоками
+по chunk_size строк, чтобы в памяти не было полной матрицы похожести.
+
+    python -m app.jobs.similarity            # только изменившиеся треки
+    python -m app.jobs.similarity --full     # полный пересчёт
+"""
+import argparse
+import asyncio
+import logging
+from array import array
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import Integer, any_, bindparam, text, delete, insert, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.database import engine
+from app.models import TrackSimilarity, TrackSimilarityDirty
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 20
+DEFAULT_CHUNK_SIZE = 2048
+FETCH_BATCH = 100_000
+SIMILARITY_LOCK_ID = 7_310_032
+
+
+def id_array(ids):
+    # Один параметр-массив вместо IN (...) с тысячами параметров
+    return any_(bindparam("ids", [int(i) for i in ids], type_=ARRAY(Integer)))
+
+
+class CooccurrenceMatrix:
+    """Нормированная матрица трек × плейлист и её транспонированная копия."""
+
+    def __init__(self, track_col: np.ndarray, playlist_col: np.ndarray):
+        self.track_ids, rows = np.unique(track_col, return_inverse=True)
+        playlist_ids, cols = np.unique(playlist_col, return_inverse=True)
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(self.track_ids), len(playlist_ids)),
+        )
+        # Дубликаты связей при сборке суммируются — вектор должен быть бинарным
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+
+        norms = np.sqrt(np.diff(matrix.indptr)).astype(np.float32)
+        self.matrix = sparse.diags(1.0 / norms) @ matrix
+        self.matrix = self.matrix.tocsr()
+        self.transposed = self.matrix.T.tocsr()
+
+    def rows_for(self, track_ids) -> np.ndarray:
+        positions = np.searchsorted(self.track_ids, track_ids)
+        positions = np.clip(positions, 0, max(len(self.track_ids) - 1, 0))
+        found = self.track_ids[positions] == track_ids if len(self.track_ids) else np.zeros(0, bool)
+        return positions[found]
+
+    def neighbours(self, rows: np.ndarray) -> np.ndarray:
+        """Строки всех треков, которые делят хотя бы один плейлист с rows."""
+        playlists = np.unique(self.matrix[rows].indices)
+        return np.unique(self.transposed[playlists].indices)
+
+    def top_k(self, rows: np.ndarray, k: int):
+        scores = (self.matrix[rows] @ self.transposed).tocsr()
+        for i, row in enumerate(rows):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            cols = scores.indices[start:end]
+            values = scores.data[start:end]
+
+            keep = cols != row
+            cols, values = cols[keep], values[keep]
+            if len(values) > k:
+                # Все кандидаты не хуже k-го по счёту: при равных оценках
+                # выбор между ними детерминирован по id трека
+                threshold = -np.partition(-values, k - 1)[k - 1]
+                candidates = values >= threshold
+                cols, values = cols[candidates], values[candidates]
+
+            order = np.lexsort((self.track_ids[cols], -values))[:k]
+            yield int(self.track_ids[row]), self.track_ids[cols[order]], values[order]
+
+
+async def load_links(conn: AsyncConnection) -> tuple[np.ndarray, np.ndarray]:
+    track_col, playlist_col = array("i"), array("i")
+    result = await conn.stream(
+        text("SELECT track_id, playlist_id FROM playlist_tracks "
+             "WHERE track_id IS NOT NULL AND playlist_id IS NOT NULL")
+    )
+    async for rows in result.partitions(FETCH_BATCH):
+        for track_id, playlist_id in rows:
+            track_col.append(track_id)
+            playlist_col.append(playlist_id)
+    await conn.commit()
+    return np.frombuffer(track_col, dtype=np.int32), np.frombuffer(playlist_col, dtype=np.int32)
+
+
+async def store_chunk(conn: AsyncConnection, results: list, computed_at: datetime):
+    track_ids = [track_id for track_id, _, _ in results]
+    rows = [
+        {
+            "track_id": track_id,
+            "rank": rank,
+            "similar_track_id": int(similar_id),
+            "score": float(score),
+            "computed_at": computed_at,
+        }
+        for track_id, similar_ids, scores in results
+        for rank, (similar_id, score) in enumerate(zip(similar_ids, scores))
+    ]
+    async with conn.begin():
+        await conn.execute(delete(TrackSimilarity).where(TrackSimilarity.track_id == id_array(track_ids)))
+        if rows:
+            await conn.execute(insert(TrackSimilarity), rows)
+
+
+async def affected_tracks(conn: AsyncConnection, matrix: CooccurrenceMatrix, dirty: np.ndarray) -> np.ndarray:
+    # Пересчитывать нужно сами изменившиеся треки, всех, кто сейчас делит с ними
+    # плейлист, и тех, у кого они уже записаны в похожих (общий плейлист мог исчезнуть)
+    result = await conn.execute(
+        select(TrackSimilarity.track_id)
+        .where(TrackSimilarity.similar_track_id == id_array(dirty))
+        .distinct()
+    )
+    referencing = np.array(result.scalars().all(), dtype=np.int32)
+    await conn.commit()
+
+    rows = matrix.rows_for(dirty)
+    neighbours = matrix.track_ids[matrix.neighbours(rows)] if len(rows) else np.zeros(0, np.int32)
+    return np.unique(np.concatenate([dirty, neighbours, referencing]))
+
+
+async def run(full: bool, top_k: int, chunk_size: int):
+    async with engine.connect() as conn:
+        locked = (await conn.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": SIMILARITY_LOCK_ID}
+        )).scalar()
+        await conn.commit()
+        if not locked:
+            logger.info("Another similarity job is running")
+            return
+
+        try:
+            await recompute(conn, full, top_k, chunk_size)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SIMILARITY_LOCK_ID})
+            await conn.commit()
+
+
+async def recompute(conn: AsyncConnection, full: bool, top_k: int, chunk_size: int):
+    computed_at = (await conn.execute(text("SELECT now()"))).scalar()
+    dirty = np.array(
+        (await conn.execute(select(TrackSimilarityDirty.track_id))).scalars().all(),
+        dtype=np.int32,
+    )
+    await conn.commit()
+
+    if not full and not len(dirty):
+        logger.info("No changed tracks, nothing to do")
+        return
+
+    matrix = CooccurrenceMatrix(*await load_links(conn))
+    logger.info("Loaded matrix: %s tracks x %s playlists, %s links",
+                matrix.matrix.shape[0], matrix.matrix.shape[1], matrix.matrix.nnz)
+
+    if full:
+        targets = matrix.track_ids
+    else:
+        targets = await affected_tracks(conn, matrix, np.sort(dirty))
+
+    rows = matrix.rows_for(targets)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        await store_chunk(conn, list(matrix.top_k(chunk, top_k)), computed_at)
+        logger.info("Stored %s/%s tracks", min(start + chunk_size, len(rows)), len(rows))
+
+    async with conn.begin():
+        if full:
+            # Треки, которые больше не встречаются ни в одном плейлисте
+            await conn.execute(delete(TrackSimilarity).where(TrackSimilarity.computed_at < computed_at))
+        else:
+            orphaned = np.setdiff1d(targets, matrix.track_ids)
+            if len(orphaned):
+                await conn.execute(delete(TrackSimilarity).where(TrackSimilarity.track_id == id_array(orphaned)))
+        # Пометки, появившиеся во время пересчёта, остаются на следующий запуск
+        await conn.execute(delete(TrackSimilarityDirty).where(TrackSimilarityDirty.marked_at <= computed_at))
+
+
+async def main(args):
+    try:
+        await run(args.full, args.top_k, args.chunk_size)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.jobs.similarity")
+    parser.add_argument("--full", action="store_true", help="Пересчитать все треки")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""Удаление старых надгробий /sync.
+
+Вместе с надгробиями поднимается граница sync_horizon: токен старше неё
+мог пропустить удаления, поэтому /sync отвечает на него 410 и клиент
+выполняет полную синхронизацию.
+
+    python -m app.jobs.sync_tombstones              # старше SYNC_TOMBSTONE_TTL_DAYS
+    python -m app.jobs.sync_tombstones --days 7
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.config import SYNC_TOMBSTONE_TTL_DAYS
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+PURGE_TOMBSTONES = text("""
+    WITH purged AS (
+        DELETE FROM sync_tombstones
+        WHERE deleted_at < now() - make_interval(days => :days)
+        RETURNING version
+    ), horizon AS (
+        UPDATE sync_horizon
+        SET version = greatest(version, (SELECT max(version) + 1 FROM purged))
+        WHERE EXISTS (SELECT 1 FROM purged)
+        RETURNING version
+    )
+    SELECT (SELECT count(*) FROM purged) AS purged, (SELECT version FROM horizon) AS horizon
+""")
+
+
+async def run(days: int):
+    async with engine.begin() as conn:
+        row = (await conn.execute(PURGE_TOMBSTONES, {"days": days})).one()
+    if row.purged:
+        logger.info("Purged %s tombstones, sync horizon is now %s", row.purged, row.horizon)
+    else:
+        logger.info("No tombstones older than %s days", days)
+
+
+async def main(args):
+    try:
+        await run(args.days)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.jobs.sync_tombstones")
+    parser.add_argument("--days", type=int, default=SYNC_TOMBSTONE_TTL_DAYS, help="Сколько дней хранить надгробия")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,335 @@
+"""Структурированные логи без блокировки event loop.
+
+Все логгеры пишут в QueueHandler на корневом логгере: в потоке event loop
+запись только проходит выборку и кладётся в очередь, а форматирование в JSON
+и вывод в stdout делает фоновый поток QueueListener. Если очередь заполнена
+(stdout не успевает), запись отбрасывается и учитывается в счётчике dropped.
+
+У каждой записи есть категория: sql — выполненные SQL-запросы, request —
+access-лог, error — всё уровня ERROR и выше, app — остальное. Для каждой
+категории задаётся доля записей, которая попадает в лог (LOG_SAMPLE_RATES).
+Доли меняются без перезапуска через PUT /admin/logging: новое значение
+рассылается всем воркерам через pg_notify.
+
+Записи внутри запроса дополняются его контекстом: request_id, route, user_id
+и db_ms — время в БД с начала запроса. Его заполняют RequestLogMiddleware,
+обработчики событий SQLAlchemy и get_current_user.
+"""
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+from app.deadline import route_key
+
+CATEGORIES = ("sql", "request", "error", "app")
+
+LOGGER_CATEGORIES = {
+    "app.sql": "sql",
+    "app.access": "request",
+    "uvicorn.access": "request",
+}
+
+# Канал, через который PUT /admin/logging рассылает доли выборки всем воркерам
+SAMPLING_CHANNEL = "log_sampling"
+
+REQUEST_ID_HEADER = b"x-request-id"
+REQUEST_ID_PATTERN = re.compile(rb"[A-Za-z0-9._-]{1,64}")
+
+MAX_STATEMENT_LENGTH = 2000
+
+sql_logger = logging.getLogger("app.sql")
+access_logger = logging.getLogger("app.access")
+logger = logging.getLogger(__name__)
+
+
+class RequestLog:
+    """Контекст запроса для записей лога.
+
+    Объект изменяемый: DeadlineMiddleware запускает обработчик отдельной
+    задачей с копией контекста, и user_id и время в БД, записанные там,
+    должны быть видны middleware снаружи.
+    """
+
+    __slots__ = ("scope", "request_id", "user_id", "db_ms", "db_queries", "_route")
+
+    def __init__(self, scope, request_id: str):
+        self.scope = scope
+        self.request_id = request_id
+        self.user_id: Optional[int] = None
+        self.db_ms = 0.0
+        self.db_queries = 0
+        self._route: Optional[str] = None
+
+    @property
+    def route(self) -> Optional[str]:
+        # Маршрут ищется только если запись попала в лог
+        if self._route is None:
+            self._route = route_key(self.scope)
+        return self._route
+
+
+request_log: ContextVar[Optional[RequestLog]] = ContextVar("request_log", default=None)
+
+
+def bind_user(user_id: int):
+    context = request_log.get()
+    if context is not None:
+        context.user_id = user_id
+
+
+def validate_rates(rates) -> dict[str, float]:
+    if not isinstance(rates, dict):
+        raise ValueError("Sample rates must be an object")
+    unknown = set(rates) - set(CATEGORIES)
+    if unknown:
+        raise ValueError(f"Unknown categories: {', '.join(sorted(unknown))}. Allowed: {', '.join(CATEGORIES)}")
+    validated = {}
+    for category, rate in rates.items():
+        if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate for {category} must be a number from 0 to 1")
+        validated[category] = float(rate)
+    return validated
+
+
+class LogSampler(logging.Filter):
+    """Выборка записей по категориям. Работает в потоке, который пишет в лог,
+    до постановки в очередь: отброшенная запись ничего не стоит writer-потоку."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = {category: 1.0 for category in CATEGORIES}
+        self.set_rates(rates)
+
+    def set_rates(self, rates: dict[str, float]):
+        # Словарь подменяется целиком: читатели в других потоках видят старый или новый
+        self.rates = {**self.rates, **validate_rates(rates)}
+
+    def sample(self, category: str) -> bool:
+        rate = self.rates[category]
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            category = "error"
+        else:
+            category = LOGGER_CATEGORIES.get(record.name, "app")
+        # SQL-запросы проходят выборку ещё до создания записи (см. _after_cursor_execute)
+        if not getattr(record, "sampled", False) and not self.sample(category):
+            return False
+
+        record.category = category
+        context = request_log.get()
+        if context is not None:
+            record.request_id = context.request_id
+            record.route = context.route
+            record.user_id = context.user_id
+            record.db_ms = round(context.db_ms, 3)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON. Работает в writer-потоке."""
+
+    CONTEXT_FIELDS = ("request_id", "route", "user_id", "db_ms")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "category": getattr(record, "category", "app"),
+            "message": record.getMessage(),
+        }
+        for field in self.CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный QueueHandler форматирует запись здесь, в потоке event loop.
+        # Очередь внутри процесса, поэтому запись передаётся как есть
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter(QueueListener):
+
+    def enqueue_sentinel(self):
+        # Очередь может быть заполнена: при остановке ждём, пока освободится место
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """Очередь записей и фоновый поток, который пишет их в stdout."""
+
+    def __init__(self, level: str, queue_size: int, rates: dict[str, float]):
+        self.level = level
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.sampler = LogSampler(rates)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.handler.addFilter(self.sampler)
+        self._listener: Optional[LogWriter] = None
+
+    def start(self):
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self._listener = LogWriter(self.queue, output)
+        self._listener.start()
+
+        root = logging.getLogger()
+        root.handlers = [self.handler]
+        root.setLevel(self.level)
+        # SQLAlchemy сам пишет каждый запрос, если его логгер пропускает INFO;
+        # SQL попадает в лог только через выборку в _after_cursor_execute
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+        # Логи uvicorn идут в ту же очередь, а не своими обработчиками в stderr
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers = []
+            uvicorn_logger.propagate = True
+
+    def stop(self):
+        # Дописывает всё, что осталось в очереди
+        logging.getLogger().removeHandler(self.handler)
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def on_sampling_notify(self, payload: str):
+        try:
+            self.sampler.set_rates(json.loads(payload))
+        except ValueError:
+            logger.warning("Malformed log sampling update: %r", payload)
+            return
+        logger.info("Log sample rates changed: %s", self.sampler.rates)
+
+    def stats(self) -> dict:
+        return {
+            "level": logging.getLevelName(logging.getLogger().level),
+            "sample_rates": self.sampler.rates,
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+        }
+
+
+log_pipeline = LogPipeline(LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES)
+
+
+def request_id_from(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == REQUEST_ID_HEADER:
+            if REQUEST_ID_PATTERN.fullmatch(value):
+                return value.decode()
+            break
+    return uuid.uuid4().hex
+
+
+class RequestLogMiddleware:
+    """Создаёт контекст лога запроса и пишет access-лог по его завершении.
+
+    Request id берётся из заголовка X-Request-Id или генерируется и
+    возвращается в ответе тем же заголовком.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        context = RequestLog(scope, request_id_from(scope))
+        status_code = 500
+
+        async def logged_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER, context.request_id.encode())]
+            await send(message)
+
+        token = request_log.set(context)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, logged_send)
+        except Exception:
+            self._log(scope, context, 500, started, exc_info=True)
+            raise
+        else:
+            self._log(scope, context, status_code, started)
+        finally:
+            request_log.reset(token)
+
+    @staticmethod
+    def _log(scope, context: RequestLog, status_code: int, started: float, exc_info: bool = False):
+        level = logging.ERROR if status_code >= 500 else logging.INFO
+        if not access_logger.isEnabledFor(level):
+            return
+        access_logger.log(
+            level, "%s %s %s", scope["method"], scope["path"], status_code,
+            exc_info=exc_info,
+            extra={"fields": {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "db_queries": context.db_queries,
+            }}
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.log_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - context.log_started) * 1000
+    request = request_log.get()
+    if request is not None:
+        request.db_ms += duration_ms
+        request.db_queries += 1
+
+    # Параметры не пишутся: среди них хэши паролей и токены
+    if log_pipeline.sampler.sample("sql") and sql_logger.isEnabledFor(logging.INFO):
+        sql_logger.info("SQL", extra={
+            "sampled": True,
+            "fields": {
+                "statement": " ".join(statement.split())[:MAX_STATEMENT_LENGTH],
+                "duration_ms": round(duration_ms, 3),
+                "executemany": executemany,
+            },
+        })
+
+
+def install_db_timing(engine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
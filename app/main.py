@@ -1,22 +1,59 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import engine, Base
+from app.config import AUTO_MIGRATE, PROFILING_ENABLED, CATALOG_SNAPSHOT_ENABLED
+from app.admission import admission_control
+from app.database import engine
+from app.deadline import DeadlineMiddleware
+from app.logs import RequestLogMiddleware, SAMPLING_CHANNEL, install_db_timing, log_pipeline
+from app.profiling import ProfilerMiddleware, install_sql_timeline
 import app.models
-from app.routes import routers
+from app.migrations.runner import ensure_schema
+from app.routes import routers, service_routers
+from app.services.play_service import play_counter, top_chart
+from app.services.catalog_service import catalog_snapshots
+from app.auth.revocation import revocation_filter
+from app.events import playlist_listener
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    log_pipeline.start()
+    await ensure_schema(engine, auto_migrate=AUTO_MIGRATE)
+    play_counter.start()
+    top_chart.start()
+    revocation_filter.start()
+    playlist_listener.add_channel(SAMPLING_CHANNEL, log_pipeline.on_sampling_notify)
+    playlist_listener.start()
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog_snapshots.start()
     yield
+    await catalog_snapshots.stop()
+    await playlist_listener.stop()
+    await revocation_filter.stop()
+    await top_chart.stop()
+    # Всё, что накопилось с последнего сброса, записывается до остановки воркера
+    await play_counter.stop()
+    await engine.dispose()
+    log_pipeline.stop()
 
 
 app = FastAPI(lifespan=lifespan)
 
+# Выключенный профайлер не подключается вовсе. Он должен быть внутри
+# DeadlineMiddleware: тот запускает обработчик отдельной задачей
+if PROFILING_ENABLED:
+    install_sql_timeline(engine)
+    app.add_middleware(ProfilerMiddleware)
+
+app.add_middleware(DeadlineMiddleware)
+
+# Снаружи DeadlineMiddleware: в access-лог попадают и ответы 504
+install_db_timing(engine)
+app.add_middleware(RequestLogMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],            
@@ -56,4 +93,7 @@ def custom_openapi():
 app.openapi = custom_openapi
 
 for router in routers:
+    app.include_router(router, dependencies=[Depends(admission_control)])
+
+for router in service_routers:
     app.include_router(router)
@@ -0,0 +1,25 @@
+from . import (
+    v0001_initial,
+    v0002_db_cascades,
+    v0003_track_similarities,
+    v0004_track_plays,
+    v0005_track_audio,
+    v0006_auth_sessions,
+    v0007_playlist_tracks_unique,
+    v0008_sync_versions,
+    v0009_playlist_tracks_track_index,
+)
+
+MIGRATIONS = [
+    v0001_initial,
+    v0002_db_cascades,
+    v0003_track_similarities,
+    v0004_track_plays,
+    v0005_track_audio,
+    v0006_auth_sessions,
+    v0007_playlist_tracks_unique,
+    v0008_sync_versions,
+    v0009_playlist_tracks_track_index,
+]
+
+LATEST_VERSION = MIGRATIONS[-1].VERSION
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import logging
+
+from app.database import engine
+from app.migrations import LATEST_VERSION
+from app.migrations.partitioning import partition_playlist_tracks
+from app.migrations.runner import get_schema_version, migrate
+
+
+async def upgrade():
+    version = await migrate(engine)
+    print(f"Schema is at version {version}")
+
+
+async def current():
+    async with engine.connect() as conn:
+        version = await get_schema_version(conn)
+    print(f"Current version: {version}, latest: {LATEST_VERSION}")
+
+
+async def partition(partitions: int):
+    if await partition_playlist_tracks(engine, partitions):
+        print(f"playlist_tracks is now split into {partitions} hash partitions")
+    else:
+        print("playlist_tracks is already partitioned")
+
+
+async def main(args):
+    try:
+        if args.command == "partition-playlist-tracks":
+            await partition(args.partitions)
+        else:
+            await {"upgrade": upgrade, "current": current}[args.command]()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["upgrade", "current", "partition-playlist-tracks"])
+    parser.add_argument(
+        "--partitions", type=int, default=16,
+        help="Число хэш-секций для partition-playlist-tracks"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args))
@@ -0,0 +1,108 @@
+"""Перевод playlist_tracks на хэш-секционирование по playlist_id.
+
+Необязательный шаг для очень больших баз, поэтому не входит в линейные
+миграции и запускается отдельно:
+
+    python -m app.migrations partition-playlist-tracks --partitions 64
+
+Таблица пересоздаётся в одной транзакции под ACCESS EXCLUSIVE: записи в
+playlist_tracks ждут до конца копирования, чтения тоже. На сотнях миллионов
+связей это десятки минут — запускать в окно обслуживания. Id связей и их
+последовательность сохраняются, так что порядок треков в плейлистах не меняется.
+
+Первичный ключ секционированной таблицы — (playlist_id, id): уникальность
+должна включать ключ секционирования. Все запросы сервиса плейлистов
+фильтруют по playlist_id и читают одну секцию; поиск по track_id
+(GET /tracks/{id}/playlists, каскад при удалении трека) обходит индексы
+всех секций.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.migrations.runner import MIGRATION_LOCK_ID
+from app.migrations.v0008_sync_versions import PLAYLIST_TRACK_TRIGGERS
+
+logger = logging.getLogger(__name__)
+
+IS_PARTITIONED = text(
+    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'playlist_tracks'::regclass)"
+)
+
+
+def partition_statements(partitions: int) -> list[str]:
+    return [
+        "LOCK TABLE playlist_tracks IN ACCESS EXCLUSIVE MODE",
+        # Имена индексов общие на схему — старые переименовываются до создания новых
+        "ALTER TABLE playlist_tracks RENAME TO playlist_tracks_unpartitioned",
+        "ALTER INDEX playlist_tracks_pkey RENAME TO playlist_tracks_unpartitioned_pkey",
+        "ALTER INDEX IF EXISTS uq_playlist_tracks_playlist_id_track_id "
+        "RENAME TO uq_playlist_tracks_unpartitioned_playlist_id_track_id",
+        "ALTER INDEX IF EXISTS ix_playlist_tracks_track_id_playlist_id "
+        "RENAME TO ix_playlist_tracks_unpartitioned_track_id_playlist_id",
+        "ALTER SEQUENCE playlist_tracks_id_seq OWNED BY NONE",
+        """
+        CREATE TABLE playlist_tracks (
+            id INTEGER NOT NULL DEFAULT nextval('playlist_tracks_id_seq'),
+            playlist_id INTEGER NOT NULL,
+            track_id INTEGER
+        ) PARTITION BY HASH (playlist_id)
+        """,
+        *(
+            f"""
+            CREATE TABLE playlist_tracks_p{remainder:03d} PARTITION OF playlist_tracks
+                FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+            """
+            for remainder in range(partitions)
+        ),
+        # Индексы и ключи строятся после копирования — так быстрее, чем поддерживать их на вставке
+        """
+        INSERT INTO playlist_tracks (id, playlist_id, track_id)
+        SELECT id, playlist_id, track_id
+        FROM playlist_tracks_unpartitioned
+        WHERE playlist_id IS NOT NULL
+        """,
+        "ALTER TABLE playlist_tracks ADD CONSTRAINT playlist_tracks_pkey PRIMARY KEY (playlist_id, id)",
+        "CREATE UNIQUE INDEX uq_playlist_tracks_playlist_id_track_id ON playlist_tracks (playlist_id, track_id)",
+        "CREATE INDEX ix_playlist_tracks_track_id_playlist_id ON playlist_tracks (track_id, playlist_id)",
+        """
+        ALTER TABLE playlist_tracks
+            ADD CONSTRAINT playlist_tracks_playlist_id_fkey
+                FOREIGN KEY (playlist_id) REFERENCES playlists (id) ON DELETE CASCADE,
+            ADD CONSTRAINT playlist_tracks_track_id_fkey
+                FOREIGN KEY (track_id) REFERENCES tracks (id) ON DELETE CASCADE
+        """,
+        "ALTER SEQUENCE playlist_tracks_id_seq OWNED BY playlist_tracks.id",
+        *PLAYLIST_TRACK_TRIGGERS,
+        "DROP TABLE playlist_tracks_unpartitioned",
+    ]
+
+
+#Функция перевода playlist_tracks на хэш-секции
+async def partition_playlist_tracks(engine: AsyncEngine, partitions: int) -> bool:
+    if partitions < 2:
+        raise ValueError("At least 2 partitions are required")
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        await conn.commit()
+        try:
+            partitioned = (await conn.execute(IS_PARTITIONED)).scalar()
+            await conn.commit()
+            if partitioned:
+                logger.info("playlist_tracks is already partitioned")
+                return False
+
+            logger.info("Partitioning playlist_tracks into %s hash partitions", partitions)
+            async with conn.begin():
+                for statement in partition_statements(partitions):
+                    await conn.execute(text(statement))
+
+            # Статистика по новым секциям нужна планировщику сразу, не дожидаясь autovacuum
+            await conn.execute(text("ANALYZE playlist_tracks"))
+            await conn.commit()
+            return True
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            await conn.commit()
@@ -0,0 +1,81 @@
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.migrations import MIGRATIONS, LATEST_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Произвольный, но постоянный ключ pg_advisory_lock для миграций
+MIGRATION_LOCK_ID = 7_310_027
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+
+#Функция получения текущей версии схемы
+async def get_schema_version(conn: AsyncConnection) -> int:
+    try:
+        result = await conn.execute(text("SELECT max(version) FROM schema_version"))
+    except DBAPIError:
+        # Таблицы ещё нет — база не мигрировалась ни разу
+        await conn.rollback()
+        return 0
+    version = result.scalar()
+    await conn.commit()
+    return version or 0
+
+
+#Функция применения недостающих миграций
+async def migrate(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        await conn.commit()
+        try:
+            await conn.execute(text(CREATE_VERSION_TABLE))
+            await conn.commit()
+
+            # Версию читаем уже под блокировкой: пока мы ждали,
+            # миграции мог применить другой процесс
+            current = await get_schema_version(conn)
+            for migration in MIGRATIONS:
+                if migration.VERSION <= current:
+                    continue
+
+                logger.info("Applying migration %s: %s", migration.VERSION, migration.DESCRIPTION)
+                async with conn.begin():
+                    for statement in migration.STATEMENTS:
+                        await conn.execute(text(statement))
+                    await conn.execute(
+                        text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                        {"v": migration.VERSION, "d": migration.DESCRIPTION}
+                    )
+                current = migration.VERSION
+            return current
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            await conn.commit()
+
+
+#Функция проверки схемы при старте воркера
+async def ensure_schema(engine: AsyncEngine, auto_migrate: bool):
+    async with engine.connect() as conn:
+        current = await get_schema_version(conn)
+
+    if current >= LATEST_VERSION:
+        return
+
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {current}, application requires {LATEST_VERSION}. "
+            "Run `python -m app.migrations upgrade` before starting the app"
+        )
+
+    await migrate(engine)
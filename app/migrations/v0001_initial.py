@@ -0,0 +1,48 @@
+VERSION = 1
+DESCRIPTION = "initial schema"
+
+# Повторяет схему, которую раньше создавал Base.metadata.create_all,
+# поэтому на уже существующей базе миграция ничего не меняет.
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        email VARCHAR(100) NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    """
+    CREATE TABLE IF NOT EXISTS albums (
+        id SERIAL PRIMARY KEY,
+        title VARCHAR(100) NOT NULL,
+        release_date DATE,
+        owner_id INTEGER NOT NULL REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tracks (
+        id SERIAL PRIMARY KEY,
+        title VARCHAR(100) NOT NULL,
+        duration INTEGER,
+        album_id INTEGER REFERENCES albums (id) ON DELETE SET NULL,
+        owner_id INTEGER NOT NULL REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS playlists (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description VARCHAR(500),
+        owner_id INTEGER NOT NULL REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS playlist_tracks (
+        id SERIAL PRIMARY KEY,
+        playlist_id INTEGER REFERENCES playlists (id),
+        track_id INTEGER REFERENCES tracks (id)
+    )
+    """,
+]
@@ -0,0 +1,17 @@
+VERSION = 2
+DESCRIPTION = "database-side cascades for playlist_tracks"
+
+STATEMENTS = [
+    """
+    ALTER TABLE playlist_tracks
+        DROP CONSTRAINT IF EXISTS playlist_tracks_playlist_id_fkey,
+        ADD CONSTRAINT playlist_tracks_playlist_id_fkey
+            FOREIGN KEY (playlist_id) REFERENCES playlists (id) ON DELETE CASCADE
+    """,
+    """
+    ALTER TABLE playlist_tracks
+        DROP CONSTRAINT IF EXISTS playlist_tracks_track_id_fkey,
+        ADD CONSTRAINT playlist_tracks_track_id_fkey
+            FOREIGN KEY (track_id) REFERENCES tracks (id) ON DELETE CASCADE
+    """,
+]
@@ -0,0 +1,25 @@
+VERSION = 3
+DESCRIPTION = "precomputed track similarities"
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS track_similarities (
+        track_id INTEGER NOT NULL REFERENCES tracks (id) ON DELETE CASCADE,
+        rank SMALLINT NOT NULL,
+        similar_track_id INTEGER NOT NULL REFERENCES tracks (id) ON DELETE CASCADE,
+        score REAL NOT NULL,
+        computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (track_id, rank)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_track_similarities_similar_track_id
+        ON track_similarities (similar_track_id)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS track_similarity_dirty (
+        track_id INTEGER PRIMARY KEY,
+        marked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+]
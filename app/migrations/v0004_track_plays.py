@@ -0,0 +1,15 @@
+VERSION = 4
+DESCRIPTION = "track play counters"
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS track_plays (
+        track_id INTEGER PRIMARY KEY REFERENCES tracks (id) ON DELETE CASCADE,
+        play_count BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_track_plays_play_count
+        ON track_plays (play_count DESC, track_id)
+    """,
+]
@@ -0,0 +1,11 @@
+VERSION = 5
+DESCRIPTION = "audio file metadata on tracks"
+
+STATEMENTS = [
+    """
+    ALTER TABLE tracks
+        ADD COLUMN IF NOT EXISTS audio_sha256 VARCHAR(64),
+        ADD COLUMN IF NOT EXISTS audio_size BIGINT,
+        ADD COLUMN IF NOT EXISTS audio_content_type VARCHAR(100)
+    """,
+]
@@ -0,0 +1,25 @@
+VERSION = 6
+DESCRIPTION = "refresh tokens and session revocations"
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS refresh_tokens (
+        jti UUID PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        session_id UUID NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL,
+        used_at TIMESTAMPTZ,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_session_id ON refresh_tokens (session_id)",
+    """
+    CREATE TABLE IF NOT EXISTS session_revocations (
+        session_id UUID PRIMARY KEY,
+        expires_at TIMESTAMPTZ NOT NULL,
+        revoked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_session_revocations_expires_at ON session_revocations (expires_at)",
+]
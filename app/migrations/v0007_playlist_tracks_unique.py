@@ -0,0 +1,17 @@
+VERSION = 7
+DESCRIPTION = "unique track per playlist"
+
+STATEMENTS = [
+    # Дубликаты могли остаться от старых версий: оставляем самую раннюю запись
+    """
+    DELETE FROM playlist_tracks duplicate
+    USING playlist_tracks original
+    WHERE duplicate.playlist_id = original.playlist_id
+        AND duplicate.track_id = original.track_id
+        AND duplicate.id > original.id
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_playlist_tracks_playlist_id_track_id
+        ON playlist_tracks (playlist_id, track_id)
+    """,
+]
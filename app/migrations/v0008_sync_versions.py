@@ -0,0 +1,104 @@
+VERSION = 8
+DESCRIPTION = "change versions and tombstones for delta sync"
+
+# Версия строки — 64-битный id транзакции, которая её последней меняла.
+# Токен синхронизации — xmin снимка (см. app/services/sync_service.py): все
+# транзакции младше него завершены, поэтому изменения, закоммиченные позже
+# чтения, не теряются, даже если их транзакция началась раньше.
+CURRENT_VERSION = "pg_current_xact_id()::text::bigint"
+
+# Отдельным списком: их же пересоздаёт перевод playlist_tracks на секции
+PLAYLIST_TRACK_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS playlist_tracks_sync_insert ON playlist_tracks",
+    """
+    CREATE TRIGGER playlist_tracks_sync_insert AFTER INSERT ON playlist_tracks
+        REFERENCING NEW TABLE AS changed_links
+        FOR EACH STATEMENT EXECUTE FUNCTION sync_touch_playlists()
+    """,
+    "DROP TRIGGER IF EXISTS playlist_tracks_sync_delete ON playlist_tracks",
+    """
+    CREATE TRIGGER playlist_tracks_sync_delete AFTER DELETE ON playlist_tracks
+        REFERENCING OLD TABLE AS changed_links
+        FOR EACH STATEMENT EXECUTE FUNCTION sync_touch_playlists()
+    """,
+]
+
+STATEMENTS = [
+    f"""
+    CREATE OR REPLACE FUNCTION sync_bump_version() RETURNS trigger AS $$
+    BEGIN
+        NEW.version := {CURRENT_VERSION};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    *(
+        statement
+        for table in ("tracks", "albums", "playlists")
+        for statement in (
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT {CURRENT_VERSION}",
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_owner_id_version ON {table} (owner_id, version)",
+            f"DROP TRIGGER IF EXISTS {table}_sync_version ON {table}",
+            f"""
+            CREATE TRIGGER {table}_sync_version BEFORE UPDATE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION sync_bump_version()
+            """,
+        )
+    ),
+    # Состав плейлиста отдаётся вместе с плейлистом, поэтому изменение связей
+    # поднимает версию самого плейлиста. Триггеры на уровне statement: вставка
+    # тысячи треков одним INSERT ... SELECT обновляет плейлист один раз
+    """
+    CREATE OR REPLACE FUNCTION sync_touch_playlists() RETURNS trigger AS $$
+    BEGIN
+        UPDATE playlists SET version = version
+        WHERE id IN (SELECT DISTINCT playlist_id FROM changed_links);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    *PLAYLIST_TRACK_TRIGGERS,
+    f"""
+    CREATE TABLE IF NOT EXISTS sync_tombstones (
+        id BIGSERIAL PRIMARY KEY,
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        owner_id INTEGER NOT NULL,
+        version BIGINT NOT NULL DEFAULT {CURRENT_VERSION},
+        deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_sync_tombstones_owner_id_version ON sync_tombstones (owner_id, version)",
+    "CREATE INDEX IF NOT EXISTS ix_sync_tombstones_deleted_at ON sync_tombstones (deleted_at)",
+    # Надгробия пишет база, поэтому каскадные и массовые удаления тоже их оставляют
+    """
+    CREATE OR REPLACE FUNCTION sync_write_tombstones() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO sync_tombstones (entity, entity_id, owner_id)
+        SELECT TG_ARGV[0], id, owner_id FROM deleted_rows;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    *(
+        statement
+        for table, entity in (("tracks", "track"), ("albums", "album"), ("playlists", "playlist"))
+        for statement in (
+            f"DROP TRIGGER IF EXISTS {table}_sync_tombstones ON {table}",
+            f"""
+            CREATE TRIGGER {table}_sync_tombstones AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS deleted_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION sync_write_tombstones('{entity}')
+            """,
+        )
+    ),
+    # Граница, до которой надгробия уже удалены: токен старше неё не может
+    # получить дельту, клиенту нужна полная синхронизация
+    """
+    CREATE TABLE IF NOT EXISTS sync_horizon (
+        id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        version BIGINT NOT NULL
+    )
+    """,
+    "INSERT INTO sync_horizon (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+]
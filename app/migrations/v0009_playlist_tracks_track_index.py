@@ -0,0 +1,12 @@
+VERSION = 9
+DESCRIPTION = "reverse index from tracks to playlists"
+
+STATEMENTS = [
+    # Нужен каскаду при удалении трека, поиску плейлистов с треком и подсчёту
+    # по index-only scan. Миграция идёт в транзакции, поэтому без CONCURRENTLY:
+    # на большой таблице её стоит запускать отдельно, вне пиковой нагрузки
+    """
+    CREATE INDEX IF NOT EXISTS ix_playlist_tracks_track_id_playlist_id
+        ON playlist_tracks (track_id, playlist_id)
+    """,
+]
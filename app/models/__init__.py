@@ -3,3 +3,7 @@ from .album import Album
 from .track import Track
 from .playlist import Playlist
 from .playlist_track import PlaylistTrack
+from .track_similarity import TrackSimilarity, TrackSimilarityDirty
+from .track_play import TrackPlay
+from .auth_session import RefreshToken, SessionRevocation
+from .sync_tombstone import SyncTombstone, SyncHorizon
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Date, FetchedValue
 from sqlalchemy.orm import relationship
 from app.database import Base
 from app.models.user import User
@@ -11,6 +11,8 @@ class Album(Base):
     title = Column(String(100), nullable=False)
     release_date = Column(Date, default=date.today)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Версия изменения для /sync, выставляется триггером в БД
+    version = Column(BigInteger, nullable=False, server_default=FetchedValue())
 
     owner = relationship("User", back_populates="albums") 
-    tracks = relationship("Track", back_populates="album")
\ No newline at end of file
+    tracks = relationship("Track", back_populates="album", passive_deletes=True)
\ No newline at end of file
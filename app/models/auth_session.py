@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, func
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    jti = Column(UUID(as_uuid=False), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    session_id = Column(UUID(as_uuid=False), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    # Токен одноразовый: при обмене на новую пару помечается использованным
+    used_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# Отозванные сессии. Запись нужна, только пока живы access-токены сессии
+class SessionRevocation(Base):
+    __tablename__ = "session_revocations"
+
+    session_id = Column(UUID(as_uuid=False), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, FetchedValue
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -9,6 +9,9 @@ class Playlist(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     description = Column(String(500), nullable=True)
+    # Версия изменения для /sync: поднимается триггером в БД, в том числе
+    # при изменении состава плейлиста
+    version = Column(BigInteger, nullable=False, server_default=FetchedValue())
 
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     owner = relationship("User", back_populates="playlists")
@@ -16,5 +19,6 @@ class Playlist(Base):
     tracks = relationship(
         "PlaylistTrack",
         back_populates="playlist",
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True
     )
@@ -1,15 +1,22 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 
 class PlaylistTrack(Base):
     __tablename__ = "playlist_tracks"
+    __table_args__ = (
+        UniqueConstraint("playlist_id", "track_id", name="uq_playlist_tracks_playlist_id_track_id"),
+        # Обратный индекс: в каких плейлистах трек
+        Index("ix_playlist_tracks_track_id_playlist_id", "track_id", "playlist_id"),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
 
-    playlist_id = Column(Integer, ForeignKey("playlists.id"))
-    track_id = Column(Integer, ForeignKey("tracks.id"))
+    # Входит в первичный ключ, чтобы удаление и обновление связи через ORM
+    # шли с условием по playlist_id и попадали в одну секцию
+    playlist_id = Column(Integer, ForeignKey("playlists.id", ondelete="CASCADE"), primary_key=True)
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"))
 
     playlist = relationship("Playlist", back_populates="tracks")
     track = relationship("Track", back_populates="playlists")
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, DateTime, FetchedValue, func
+from app.database import Base
+
+
+# Надгробия удалённых треков, альбомов и плейлистов для /sync.
+# Записи создаёт триггер на удаление, приложение их только читает
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+
+    id = Column(BigInteger, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, nullable=False, server_default=FetchedValue())
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+
+# Версия, до которой надгробия уже удалены (одна строка)
+class SyncHorizon(Base):
+    __tablename__ = "sync_horizon"
+
+    id = Column(SmallInteger, primary_key=True, default=1)
+    version = Column(BigInteger, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, FetchedValue
 from sqlalchemy.orm import relationship
 from app.database import Base
 from app.models.user import User
@@ -12,10 +12,19 @@ class Track(Base):
     album_id = Column(Integer, ForeignKey("albums.id", ondelete="SET NULL"), nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # автор
 
+    # Аудиофайл хранится по SHA-256 содержимого (см. app/storage.py)
+    audio_sha256 = Column(String(64), nullable=True)
+    audio_size = Column(BigInteger, nullable=True)
+    audio_content_type = Column(String(100), nullable=True)
+
+    # Версия изменения для /sync, выставляется триггером в БД
+    version = Column(BigInteger, nullable=False, server_default=FetchedValue())
+
     album = relationship("Album", back_populates="tracks")
     owner = relationship("User")
     playlists = relationship(
         "PlaylistTrack",
         back_populates="track",
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True
     )
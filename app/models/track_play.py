@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey
+from app.database import Base
+
+
+class TrackPlay(Base):
+    __tablename__ = "track_plays"
+
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    play_count = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, SmallInteger, Float, ForeignKey, DateTime, func
+from app.database import Base
+
+
+class TrackSimilarity(Base):
+    __tablename__ = "track_similarities"
+
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(SmallInteger, primary_key=True)
+    similar_track_id = Column(
+        Integer, ForeignKey("tracks.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    score = Column(Float(precision=24), nullable=False)
+    computed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# Треки, чьи плейлисты изменились с последнего пересчёта похожести
+class TrackSimilarityDirty(Base):
+    __tablename__ = "track_similarity_dirty"
+
+    track_id = Column(Integer, primary_key=True)
+    marked_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,197 @@
+"""Согласование формата и сжатия для больших списочных ответов.
+
+Маршрут с response_class=CompactResponse отдаёт MessagePack вместо JSON,
+если клиент просит его в Accept, и сжимает тело (brotli или gzip по
+Accept-Encoding), когда оно больше COMPRESSION_MIN_SIZE. CatalogResponse
+дополнительно кладёт сжатые байты в общий кэш по хэшу тела: одинаковый
+каталог сжимается один раз, а не на каждый запрос.
+
+Работает только на маршрутах роутера с route_class=NegotiatedRoute,
+остальные ответы он не трогает.
+"""
+import asyncio
+import gzip
+import hashlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+import brotli
+import msgpack
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.config import COMPRESSION_MIN_SIZE, COMPRESSED_CACHE_SIZE
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+
+# Умеренная степень сжатия: brotli q11 сжимает каталог на 100k треков (11 МБ)
+# десятки секунд, q5 — доли секунды при близком размере. Сжатие выполняется
+# в пуле потоков, чтобы не останавливать event loop
+ENCODERS = {
+    "br": lambda body: brotli.compress(body, quality=5),
+    "gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0),
+}
+
+# У каждого варианта тела свой ETag: сжатые и несжатые байты различаются
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz"}
+
+# Формат, выбранный по Accept для текущего запроса
+response_format: ContextVar[str] = ContextVar("response_format", default=JSON_MEDIA_TYPE)
+
+
+def parse_quality(header: str) -> dict[str, float]:
+    """Разбирает Accept/Accept-Encoding в {значение: q}."""
+    result = {}
+    for part in header.split(","):
+        value, *params = part.strip().split(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, raw = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        result[value] = max(q, result.get(value, 0.0))
+    return result
+
+
+def choose_format(accept: str) -> str:
+    accepted = parse_quality(accept)
+    msgpack_q = max((accepted.get(t, 0.0) for t in MSGPACK_MEDIA_TYPES), default=0.0)
+    json_q = max(accepted.get(JSON_MEDIA_TYPE, 0.0), accepted.get("application/*", 0.0), accepted.get("*/*", 0.0))
+    # При равенстве остаётся JSON — MessagePack только по явной просьбе
+    return MSGPACK_MEDIA_TYPE if msgpack_q > json_q else JSON_MEDIA_TYPE
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = parse_quality(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODERS:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressedCache:
+    """LRU сжатых тел с ограничением по суммарному размеру в байтах.
+
+    Одновременные промахи по одному ключу ждут одно и то же сжатие.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._pending: dict[tuple[str, str], asyncio.Task] = {}
+
+    def get(self, key: tuple[str, str]) -> Optional[bytes]:
+        body = self._items.get(key)
+        if body is not None:
+            self._items.move_to_end(key)
+        return body
+
+    def put(self, key: tuple[str, str], body: bytes):
+        if len(body) > self.max_bytes or key in self._items:
+            return
+        self._items[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    async def compress(self, key: tuple[str, str], body: bytes) -> bytes:
+        compressed = self.get(key)
+        if compressed is not None:
+            return compressed
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compress(key, body))
+            self._pending[key] = task
+        # Отключение одного клиента не должно отменять сжатие для остальных
+        return await asyncio.shield(task)
+
+    async def _compress(self, key: tuple[str, str], body: bytes) -> bytes:
+        try:
+            compressed = await run_in_threadpool(ENCODERS[key[0]], body)
+            self.put(key, compressed)
+            return compressed
+        finally:
+            self._pending.pop(key, None)
+
+
+compressed_cache = CompressedCache(COMPRESSED_CACHE_SIZE)
+
+
+class CompactResponse(JSONResponse):
+    """JSON или MessagePack — в зависимости от Accept текущего запроса."""
+
+    cache_compressed = False
+
+    def render(self, content) -> bytes:
+        self.media_type = response_format.get()
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return msgpack.packb(content)
+        return super().render(content)
+
+
+class CatalogResponse(CompactResponse):
+    """Публичный каталог: сжатое тело кэшируется и переиспользуется."""
+
+    cache_compressed = True
+
+
+async def compress_response(request: Request, response: CompactResponse) -> Response:
+    body_hash = hashlib.blake2b(response.body, digest_size=16).hexdigest()
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+
+    encoding = None
+    if len(response.body) >= COMPRESSION_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    etag = f'"{body_hash}{ETAG_SUFFIXES.get(encoding, "")}"'
+    response.headers["ETag"] = etag
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Vary": response.headers["Vary"]})
+    if encoding is None:
+        return response
+
+    if response.cache_compressed:
+        body = await compressed_cache.compress((encoding, body_hash), response.body)
+    else:
+        body = await run_in_threadpool(ENCODERS[encoding], response.body)
+
+    response.body = body
+    response.headers["Content-Encoding"] = encoding
+    response.headers["Content-Length"] = str(len(body))
+    return response
+
+
+class NegotiatedRoute(APIRoute):
+    """Маршрут, который выбирает формат до вызова эндпоинта и сжимает результат."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request) -> Response:
+            token = response_format.set(choose_format(request.headers.get("accept", "")))
+            try:
+                response = await handler(request)
+            finally:
+                response_format.reset(token)
+            if isinstance(response, CompactResponse):
+                return await compress_response(request, response)
+            return response
+
+        return negotiated_handler
@@ -0,0 +1,305 @@
+"""Профилирование отдельных запросов в продакшене.
+
+Профилируется доля PROFILE_SAMPLE_RATE запросов и любой запрос с заголовком
+X-Profile-Token, равным ADMIN_TOKEN. Пока идёт хотя бы один такой запрос,
+фоновый поток каждые PROFILE_SAMPLE_INTERVAL секунд снимает стек потока
+event loop. Если запрос сейчас выполняется, его кадры видны в этом стеке;
+если ждёт (БД, сеть), стек восстанавливается по цепочке cr_await его корутины
+и заканчивается пометкой [await]. Так профиль показывает и CPU, и ожидание.
+
+Вместе со стеками сохраняется таймлайн SQL-запросов. Результат пишется
+JSON-файлом в PROFILE_DIR, где хранятся последние PROFILE_MAX_FILES профилей;
+читать их можно через /admin/profiles. При PROFILING_ENABLED=false middleware
+и обработчики событий SQLAlchemy не подключаются вовсе.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.config import (
+    ADMIN_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_SAMPLE_INTERVAL, PROFILE_DIR, PROFILE_MAX_FILES,
+    STREAMING_ROUTES,
+)
+from app.deadline import route_key
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-token"
+
+# Ограничения на один запрос, чтобы профиль не разрастался
+MAX_STACK_DEPTH = 128
+MAX_SQL_ENTRIES = 1000
+MAX_STATEMENT_LENGTH = 500
+
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def awaited_frames(awaitable) -> list:
+    """Кадры приостановленной цепочки await, от внешнего к внутреннему."""
+    frames = []
+    while awaitable is not None and len(frames) < MAX_STACK_DEPTH:
+        if isinstance(awaitable, asyncio.Task):
+            awaitable = awaitable.get_coro()
+            continue
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+        )
+        if frame is not None:
+            frames.append(frame)
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return frames
+
+
+class RequestProfile:
+
+    def __init__(self, scope, marker, coroutine):
+        self.id = uuid.uuid4().hex
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.route = route_key(scope)
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        # Кадр middleware: если он в стеке потока, запрос сейчас выполняется
+        self.marker = marker
+        self.coroutine = coroutine
+        self.stacks: Counter[str] = Counter()
+        self.sql: list[dict] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def record_sql(self, statement: str, started: float, finished: float, executemany: bool):
+        if len(self.sql) >= MAX_SQL_ENTRIES:
+            return
+        self.sql.append({
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round((finished - started) * 1000, 3),
+            "statement": " ".join(statement.split())[:MAX_STATEMENT_LENGTH],
+            "executemany": executemany,
+        })
+
+    def collapsed(self) -> str:
+        """Стеки в формате flamegraph.pl/speedscope: "a;b;c count" на строку."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "started_at": self.started_at,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "pid": os.getpid(),
+            "sample_interval_ms": PROFILE_SAMPLE_INTERVAL * 1000,
+            "samples": sum(self.stacks.values()),
+            "sql_count": len(self.sql),
+            "sql_ms": round(sum(entry["duration_ms"] for entry in self.sql), 3),
+            "sql": self.sql,
+            "stacks": self.collapsed(),
+        }
+
+
+class StackSampler:
+    """Поток, который снимает стеки активных профилей, пока они есть."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles: dict[str, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._loop_thread_id = threading.get_ident()
+            self._profiles[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.pop(profile.id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                # Под блокировкой: завершённый запрос не сериализуется посреди записи стека
+                self.sample(list(self._profiles.values()))
+
+    def sample(self, profiles: list[RequestProfile]):
+        running = []
+        frame = sys._current_frames().get(self._loop_thread_id)
+        while frame is not None:
+            running.append(frame)
+            frame = frame.f_back
+        running.reverse()
+        positions = {id(f): i for i, f in enumerate(running)}
+
+        for profile in profiles:
+            position = positions.get(id(profile.marker))
+            if position is not None:
+                frames = running[position + 1:][-MAX_STACK_DEPTH:]
+                leaf = []
+            else:
+                frames = awaited_frames(profile.coroutine)
+                leaf = ["[await]"]
+            stack = ";".join([frame_label(f) for f in frames] + leaf)
+            if stack:
+                profile.stacks[stack] += 1
+
+
+class ProfileStore:
+    """Кольцевой буфер профилей на диске: при переполнении удаляются самые старые."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def _files(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        # Имя начинается с времени в наносекундах, поэтому сортировка по имени — по времени
+        return sorted(self.directory.glob("*.json"))
+
+    def save(self, profile: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns():020d}-{profile['id']}.json"
+        tmp_path = self.directory / f".{name}.tmp"
+        tmp_path.write_text(json.dumps(profile))
+        os.replace(tmp_path, self.directory / name)
+
+        files = self._files()
+        for path in files[:max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
+
+    def list(self, limit: int) -> list[dict]:
+        summaries = []
+        for path in reversed(self._files()):
+            if len(summaries) >= limit:
+                break
+            try:
+                profile = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # Файл успели вытеснить другие воркеры
+                continue
+            profile.pop("sql", None)
+            profile.pop("stacks", None)
+            summaries.append(profile)
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not profile_id.isalnum():
+            return None
+        for path in self.directory.glob(f"*-{profile_id}.json"):
+            try:
+                return json.loads(path.read_text())
+            except (OSError, ValueError):
+                return None
+        return None
+
+
+sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+
+
+def wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return bool(ADMIN_TOKEN) and secrets.compare_digest(value, ADMIN_TOKEN.encode())
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class ProfilerMiddleware:
+    """Профилирует выбранные запросы, остальные проходят без изменений.
+
+    Ответ профилированного запроса получает заголовок X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if route_key(scope) in STREAMING_ROUTES:
+            # Потоки живут минутами — их профиль был бы бесконечным
+            await self.app(scope, receive, send)
+            return
+
+        async def profiled_send(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        coroutine = self.app(scope, receive, profiled_send)
+        profile = RequestProfile(scope, sys._getframe(), coroutine)
+        token = current_profile.set(profile)
+        sampler.add(profile)
+        try:
+            await coroutine
+        finally:
+            sampler.remove(profile)
+            current_profile.reset(token)
+            profile.duration_ms = round(profile.elapsed_ms(), 3)
+            await self._store(profile)
+
+    @staticmethod
+    async def _store(profile: RequestProfile):
+        try:
+            await asyncio.to_thread(profile_store.save, profile.to_dict())
+        except Exception:
+            logger.exception("Failed to store request profile %s", profile.id)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        context.profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started = getattr(context, "profile_started", None)
+    if profile is None or started is None:
+        return
+    profile.record_sql(statement, started, time.perf_counter(), executemany)
+
+
+def install_sql_timeline(engine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
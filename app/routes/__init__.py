@@ -2,5 +2,10 @@ from .auth import router as auth_router
 from .album import router as album_router
 from .track import router as track_router
 from .playlist import router as playlist_router
+from .charts import router as charts_router
+from .sync import router as sync_router
+from .batch import router as batch_router
+from .admin import router as admin_router
 
-routers = [auth_router, playlist_router, track_router, album_router]
\ No newline at end of file
+routers = [auth_router, playlist_router, track_router, album_router, charts_router, sync_router, batch_router]
+service_routers = [admin_router]
\ No newline at end of file
@@ -0,0 +1,114 @@
+import json
+from typing import Dict
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.admission import admission
+from app.auth.dependencies import require_admin
+from app.database import get_db
+from app.events import event_hub
+from app.logs import SAMPLING_CHANNEL, log_pipeline, validate_rates
+from app.profiling import profile_store
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+#Эндпоинт состояния admission control
+@router.get("/admission",
+    summary="Admission Control Stats",
+    description=(
+        "Возвращает текущие лимиты, загрузку очередей "
+        "и число отклонённых запросов по маршрутам и пользователям"
+    ))
+async def get_admission_stats():
+    return admission.stats()
+
+
+#Эндпоинт состояния ленты изменений
+@router.get("/events",
+    summary="Event Feed Stats",
+    description=(
+        "Возвращает число подписчиков ленты изменений в этом воркере "
+        "и сколько медленных подписчиков было отключено"
+    ))
+async def get_event_stats():
+    return event_hub.stats()
+
+
+#Эндпоинт состояния логов
+@router.get("/logging",
+    summary="Logging Stats",
+    description=(
+        "Возвращает уровень логов, доли выборки по категориям, "
+        "длину очереди записей и число отброшенных записей в этом воркере"
+    ))
+async def get_logging_stats():
+    return log_pipeline.stats()
+
+
+#Эндпоинт изменения долей выборки логов
+@router.put("/logging",
+    summary="Update Log Sample Rates",
+    description=(
+        "Меняет долю записей категорий sql, request, error и app, которая попадает в лог "
+        "(от 0 до 1), во всех воркерах без перезапуска. Значения действуют до перезапуска воркера"
+    ))
+async def update_log_sample_rates(
+    sample_rates: Dict[str, float] = Body(..., examples=[{"sql": 0.01, "error": 1}]),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        rates = validate_rates(sample_rates)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # Этот воркер применяет сразу, остальные — получив уведомление
+    log_pipeline.sampler.set_rates(rates)
+    await db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": SAMPLING_CHANNEL, "payload": json.dumps(rates)}
+    )
+    await db.commit()
+    return log_pipeline.stats()
+
+
+#Эндпоинт списка профилей запросов
+@router.get("/profiles",
+    summary="Request Profiles",
+    description=(
+        "Возвращает последние сохранённые профили запросов без стеков и SQL: "
+        "маршрут, статус, длительность, число сэмплов и SQL-запросов"
+    ))
+async def get_profiles(limit: int = Query(50, ge=1, le=1000)):
+    return await run_in_threadpool(profile_store.list, limit)
+
+
+#Эндпоинт профиля запроса
+@router.get("/profiles/{profile_id}",
+    summary="Request Profile",
+    description=(
+        "Возвращает профиль запроса целиком: таймлайн SQL-запросов "
+        "и стеки в свёрнутом формате (поле stacks)"
+    ))
+async def get_profile(profile_id: str):
+    profile = await run_in_threadpool(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
+
+
+#Эндпоинт стеков профиля для flame graph
+@router.get("/profiles/{profile_id}/collapsed", response_class=PlainTextResponse,
+    summary="Request Profile Flame Graph Stacks",
+    description=(
+        "Возвращает стеки профиля в свёрнутом формате "
+        "для flamegraph.pl или speedscope"
+    ))
+async def get_profile_stacks(profile_id: str):
+    profile = await run_in_threadpool(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile["stacks"]
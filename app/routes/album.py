@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.negotiation import NegotiatedRoute, CatalogResponse
 from app.auth.dependencies import get_current_user
 from app.services.album_service import AlbumService
 from app.schemas.album import AlbumCreate, AlbumResponse
+from app.schemas.include import AlbumDocument, AlbumListDocument
+from app.services.catalog_service import CatalogService, get_catalog_loaders
+from app.services.include_service import IncludeService, Loaders, get_loaders, ALBUM_INCLUDES
 
-router = APIRouter(prefix="/albums", tags=["Albums"])
+router = APIRouter(prefix="/albums", tags=["Albums"], route_class=NegotiatedRoute)
 
 #Эндпоинт создания альбома
 @router.post("/", response_model=AlbumResponse,
@@ -20,33 +26,72 @@ async def create_album(
     return await AlbumService.create_album(album, db, user.id)
 
 #Эндпоинт получения всех альбомов
-@router.get("/", response_model=list[AlbumResponse],
+@router.get("/", response_model=Union[list[AlbumResponse], AlbumListDocument],
+    response_class=CatalogResponse,
     description=(
-        "Возвращает список всех альбомов " 
+        "Возвращает список всех альбомов. " 
+        "Параметр include=tracks,owner добавляет связанные ресурсы в ответ. "
+        "Accept: application/msgpack возвращает MessagePack, ответ сжимается по Accept-Encoding. "
+        "Данные могут отставать на несколько секунд"
     ))
-async def get_all_albums(db: AsyncSession = Depends(get_db)):
-    return await AlbumService.get_all_albums(db)
+async def get_all_albums(
+    include: Optional[str] = Query(None, description="tracks,owner"),
+    db: AsyncSession = Depends(get_db),
+    loaders: Loaders = Depends(get_catalog_loaders)
+):
+    relations = IncludeService.parse_include(include, ALBUM_INCLUDES)
+    albums = CatalogService.get_all_albums()
+    if albums is None:
+        albums = await AlbumService.get_all_albums(db)
+    if not relations:
+        return albums
+
+    included = await IncludeService.resolve(db, loaders, relations, albums)
+    return AlbumListDocument(data=albums, included=included)
 
 #Эндпоинт получения альбомов юзера
-@router.get("/my", response_model=list[AlbumResponse],
+@router.get("/my", response_model=Union[list[AlbumResponse], AlbumListDocument],
     summary="Get User Albums",
     description=(
-        "Возвращает список альбомов пользователя " 
+        "Возвращает список альбомов пользователя. " 
+        "Параметр include=tracks,owner добавляет связанные ресурсы в ответ"
     ))
 async def get_user_albums(
+    include: Optional[str] = Query(None, description="tracks,owner"),
     db: AsyncSession = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    return await AlbumService.get_user_albums(user.id, db)
+    relations = IncludeService.parse_include(include, ALBUM_INCLUDES)
+    albums = await AlbumService.get_user_albums(user.id, db)
+    if not relations:
+        return albums
+
+    included = await IncludeService.resolve(db, loaders, relations, albums)
+    return AlbumListDocument(data=albums, included=included)
 
 #Эндпоинт получения альбома по id
-@router.get("/{album_id}", response_model=AlbumResponse,
+@router.get("/{album_id}", response_model=Union[AlbumResponse, AlbumDocument],
     summary="Get Album by ID",
     description=(
-        "Возвращает информацию об альбоме " 
+        "Возвращает информацию об альбоме. " 
+        "Параметр include=tracks,owner добавляет связанные ресурсы в ответ. "
+        "Данные могут отставать на несколько секунд"
     ))
-async def get_album(album_id: int, db: AsyncSession = Depends(get_db)):
-    return await AlbumService.get_album(album_id, db)
+async def get_album(
+    album_id: int,
+    include: Optional[str] = Query(None, description="tracks,owner"),
+    db: AsyncSession = Depends(get_db),
+    loaders: Loaders = Depends(get_catalog_loaders)
+):
+    relations = IncludeService.parse_include(include, ALBUM_INCLUDES)
+    # Альбома, созданного после сборки снимка, в нём нет — он читается из БД
+    album = CatalogService.get_album(album_id) or await AlbumService.get_album(album_id, db)
+    if not relations:
+        return album
+
+    included = await IncludeService.resolve(db, loaders, relations, [album])
+    return AlbumDocument(data=album, included=included)
 
 #Эндпоинт удаления альбома
 @router.delete("/{album_id}",
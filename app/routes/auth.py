@@ -4,9 +4,9 @@ from sqlalchemy import select
 from app.auth.dependencies import get_current_user
 from app.database import get_db
 from app.models.user import User
-from app.schemas.user import UserCreate, UserLogin, UserResponse
+from app.schemas.user import UserCreate, UserLogin, UserResponse, CurrentUser, RefreshRequest, TokenResponse
 from app.auth.security import hash_password, verify_password
-from app.auth.jwt_handler import create_access_token
+from app.services.token_service import TokenService
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -39,9 +39,10 @@ async def register_user(data: UserCreate, db: AsyncSession = Depends(get_db)):
     return new_user
 
 #Эндпоинт логина
-@router.post("/login", 
+@router.post("/login", response_model=TokenResponse,
     description=(
-        "Авторизовывает пользователя" 
+        "Авторизовывает пользователя. " 
+        "Возвращает короткоживущий access-токен и одноразовый refresh-токен"
     ))
 async def login(data: UserLogin, db: AsyncSession = Depends(get_db),):
     query = select(User).where(User.email == data.email)
@@ -54,10 +55,43 @@ async def login(data: UserLogin, db: AsyncSession = Depends(get_db),):
             detail="Invalid email or password"
         )
 
-    access_token = create_access_token({"sub": str(user.id)})
+    return await TokenService.issue_tokens(db, user.id, user.username)
 
-    return {"access_token": access_token, "token_type": "bearer"}
+#Эндпоинт обновления токенов
+@router.post("/refresh", response_model=TokenResponse,
+    description=(
+        "Обменивает refresh-токен на новую пару токенов. " 
+        "Повторное использование refresh-токена отзывает всю сессию"
+    ))
+async def refresh(data: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    return await TokenService.refresh_tokens(db, data.refresh_token)
+
+#Эндпоинт выхода
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT,
+    description=(
+        "Отзывает текущую сессию: её access-токены перестают приниматься " 
+        "в течение нескольких секунд, refresh-токены — сразу"
+    ))
+async def logout(current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    await TokenService.revoke_sessions(db, [current_user.session_id])
+
+#Эндпоинт выхода со всех устройств
+@router.post("/logout-all",
+    description=(
+        "Отзывает все сессии пользователя" 
+    ))
+async def logout_all(current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await TokenService.revoke_user_sessions(db, current_user.id)
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user),):
-    return current_user
\ No newline at end of file
+async def get_me(current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).where(User.id == current_user.id))
+    user = result.scalars().first()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    return user
\ No newline at end of file
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+
+from app.auth.dependencies import get_current_user
+from app.schemas.batch import BatchRequest, BatchResponse
+from app.schemas.user import CurrentUser
+from app.services.batch_service import BatchService
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+#Эндпоинт выполнения пакета операций
+@router.post("", response_model=BatchResponse,
+    summary="Run Batch",
+    description=(
+        "Выполняет операции по порядку в одной транзакции: либо все, либо ни одной. "
+        "Операции: album.create, album.delete, track.create, track.delete, playlist.create, "
+        "playlist.update, playlist.delete, playlist.add_track, playlist.remove_track; "
+        "args — те же поля, что у соответствующих эндпоинтов. "
+        "Операция создания с ref делает id объекта доступным следующим операциям "
+        "через значение {\"$ref\": \"имя\"}. "
+        "При ошибке возвращается её статус и detail с index операции"
+    ))
+async def run_batch(
+    data: BatchRequest,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    return await BatchService.run(data.operations, current_user.id)
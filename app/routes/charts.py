@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Query
+
+from app.schemas.track import ChartEntryResponse
+from app.services.play_service import top_chart
+
+router = APIRouter(prefix="/charts", tags=["Charts"])
+
+#Эндпоинт получения чарта
+@router.get("/top", response_model=list[ChartEntryResponse],
+    summary="Get Top Chart",
+    description=(
+        "Возвращает самые прослушиваемые треки. "
+        "Чарт пересчитывается периодически, а не при каждом запросе"
+    ))
+async def get_top_chart(limit: int = Query(50, ge=1, le=100)):
+    return await top_chart.get_top(limit)
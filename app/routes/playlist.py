@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Depends
+from typing import Optional, Union
+
+from fastapi import APIRouter, Body, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
+from app.events import event_hub, event_stream, user_topic, playlist_topic
+from app.negotiation import NegotiatedRoute, CompactResponse
 from app.auth.dependencies import get_current_user
-from app.schemas.playlist import PlaylistCreate, PlaylistResponse, PlaylistUpdate
-from app.models.user import User
+from app.schemas.playlist import (
+    PlaylistCreate, PlaylistResponse, PlaylistUpdate, PlaylistClone, PlaylistSetOperation
+)
+from app.schemas.include import PlaylistDocument, PlaylistListDocument
+from app.schemas.user import CurrentUser
 from app.services.playlist_service import PlaylistService
+from app.services.include_service import IncludeService, Loaders, get_loaders, PLAYLIST_INCLUDES
+
+router = APIRouter(prefix="/playlists", tags=["Playlists"], route_class=NegotiatedRoute)
 
-router = APIRouter(prefix="/playlists", tags=["Playlists"])
+MAX_BULK_IDS = 1000
 
 #Эндпоинт создания плейлиста
 @router.post("/", 
@@ -18,37 +29,174 @@ router = APIRouter(prefix="/playlists", tags=["Playlists"])
     ))
 async def create_playlist(
     data: PlaylistCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     return await PlaylistService.create_playlist(db, data, current_user.id)
 
 
+#Эндпоинт объединения плейлистов
+@router.post("/union", response_model=PlaylistResponse,
+    summary="Union Playlists",
+    description=(
+        "Создает плейлист из треков всех указанных плейлистов без повторов. "
+        "Выполняется в БД одним запросом"
+    ))
+async def union_playlists(
+    data: PlaylistSetOperation,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return await PlaylistService.combine_playlists(
+        db, "union", data.playlist_ids, data.name, data.description, current_user.id
+    )
+
+
+#Эндпоинт пересечения плейлистов
+@router.post("/intersect", response_model=PlaylistResponse,
+    summary="Intersect Playlists",
+    description=(
+        "Создает плейлист из треков, которые есть во всех указанных плейлистах. "
+        "Выполняется в БД одним запросом"
+    ))
+async def intersect_playlists(
+    data: PlaylistSetOperation,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return await PlaylistService.combine_playlists(
+        db, "intersect", data.playlist_ids, data.name, data.description, current_user.id
+    )
+
+
+#Эндпоинт разности плейлистов
+@router.post("/difference", response_model=PlaylistResponse,
+    summary="Difference of Playlists",
+    description=(
+        "Создает плейлист из треков первого плейлиста, которых нет в остальных. "
+        "Выполняется в БД одним запросом"
+    ))
+async def difference_playlists(
+    data: PlaylistSetOperation,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return await PlaylistService.combine_playlists(
+        db, "difference", data.playlist_ids, data.name, data.description, current_user.id
+    )
+
+
 #Эндпоинт получения всех плейлистов
-@router.get("/", response_model=list[PlaylistResponse],
+@router.get("/", response_model=Union[list[PlaylistResponse], PlaylistListDocument],
+    response_class=CompactResponse,
     summary="Get User Playlists",
     description=(
-        "Возвращает список плейлистов пользователя" 
+        "Возвращает список плейлистов пользователя. " 
+        "Параметр include=tracks,owner,album добавляет связанные ресурсы в ответ. "
+        "Accept: application/msgpack возвращает MessagePack, ответ сжимается по Accept-Encoding"
     ))
 async def get_playlists(
-    current_user: User = Depends(get_current_user),
+    include: Optional[str] = Query(None, description="tracks,owner,album"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
+):
+    relations = IncludeService.parse_include(include, PLAYLIST_INCLUDES)
+    playlists = await PlaylistService.get_user_playlists(db, current_user.id)
+    if not relations:
+        return playlists
+
+    included = await IncludeService.resolve(db, loaders, relations, playlists)
+    return PlaylistListDocument(data=playlists, included=included)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+#Эндпоинт ленты изменений плейлистов пользователя
+@router.get("/events",
+    summary="Playlist Change Feed",
+    description=(
+        "Поток Server-Sent Events об изменениях всех плейлистов пользователя: "
+        "created, updated, track_added, track_removed, deleted. "
+        "Событие resync означает, что часть событий потеряна и плейлисты нужно перечитать"
+    ))
+async def playlist_events(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Та же сессия, что у get_current_user: проверка отзыва сессии могла открыть
+    # транзакцию, а поток долгий — соединение с БД возвращаем в пул до его начала
+    await db.close()
+
+    return StreamingResponse(
+        event_stream(event_hub, [user_topic(current_user.id)]),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+#Эндпоинт ленты изменений одного плейлиста
+@router.get("/{playlist_id}/events",
+    summary="Single Playlist Change Feed",
+    description=(
+        "Поток Server-Sent Events об изменениях плейлиста. "
+        "Доступно только его владельцу"
+    ))
+async def single_playlist_events(
+    playlist_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    return await PlaylistService.get_user_playlists(db, current_user.id)
+    playlist = await PlaylistService.get_playlist_by_id(db, playlist_id)
+    PlaylistService.check_access(playlist, current_user.id)
+    # Поток долгий — соединение с БД возвращаем в пул до его начала
+    await db.close()
+
+    return StreamingResponse(
+        event_stream(event_hub, [playlist_topic(playlist_id)]),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 #Эндпоинт получения плейлиста по id
-@router.get("/{playlist_id}", response_model=PlaylistResponse,
+@router.get("/{playlist_id}", response_model=Union[PlaylistResponse, PlaylistDocument],
     summary="Get Playlist by ID",
     description=(
-        "Возвращает информацию о плейлисте " 
+        "Возвращает информацию о плейлисте. " 
+        "Параметр include=tracks,owner,album добавляет связанные ресурсы в ответ"
     ))
 async def get_playlist(
     playlist_id: int,
-    current_user: User = Depends(get_current_user),
+    include: Optional[str] = Query(None, description="tracks,owner,album"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
+):
+    relations = IncludeService.parse_include(include, PLAYLIST_INCLUDES)
+    playlist = await PlaylistService.get_playlist(db, playlist_id, current_user.id)
+    if not relations:
+        return playlist
+
+    included = await IncludeService.resolve(db, loaders, relations, [playlist])
+    return PlaylistDocument(data=playlist, included=included)
+
+
+#Эндпоинт копирования плейлиста
+@router.post("/{playlist_id}/clone", response_model=PlaylistResponse,
+    summary="Clone Playlist",
+    description=(
+        "Создает копию плейлиста со всеми треками. "
+        "По умолчанию название — исходное с припиской (copy)"
+    ))
+async def clone_playlist(
+    playlist_id: int,
+    data: PlaylistClone = Body(default_factory=PlaylistClone),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    return await PlaylistService.get_playlist(db, playlist_id, current_user.id)
+    return await PlaylistService.clone_playlist(db, playlist_id, data, current_user.id)
 
 
 #Эндпоинт редактирования плейлиста
@@ -61,7 +209,7 @@ async def get_playlist(
 async def update_playlist(
     playlist_id: int,
     data: PlaylistUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     payload = data.model_dump(exclude_unset=True)
@@ -79,7 +227,7 @@ async def add_track(
     playlist_id: int,
     track_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     return await PlaylistService.add_track_to_playlist(db, playlist_id, track_id, current_user.id)
 
@@ -94,12 +242,27 @@ async def remove_track(
     playlist_id: int,
     track_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     return await PlaylistService.remove_track_from_playlist(
         db, playlist_id, track_id, current_user.id
     )
 
+#Массовое удаление
+@router.delete("/",
+    summary="Delete Playlists",
+    description=(
+        "Удаляет несколько плейлистов одним запросом: ?ids=1&ids=2. "
+        "Удаляются только плейлисты текущего пользователя, "
+        "в ответе возвращаются id удалённых плейлистов"
+    ))
+async def delete_playlists(
+    ids: list[int] = Query(..., max_length=MAX_BULK_IDS),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return await PlaylistService.delete_playlists(db, ids, current_user.id)
+
 #Удаление
 @router.delete("/{playlist_id}", status_code=204,
     description=(
@@ -108,7 +271,7 @@ async def remove_track(
     ))
 async def delete_playlist(
     playlist_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     return await PlaylistService.delete_playlist(db, playlist_id, current_user.id)
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.auth.dependencies import get_current_user
+from app.negotiation import NegotiatedRoute, CompactResponse
+from app.schemas.sync import SyncResponse
+from app.services.sync_service import SyncService
+
+router = APIRouter(prefix="/sync", tags=["Sync"], route_class=NegotiatedRoute)
+
+#Эндпоинт получения изменений библиотеки
+@router.get("", response_model=SyncResponse,
+    response_class=CompactResponse,
+    summary="Sync Library",
+    description=(
+        "Возвращает треки, альбомы и плейлисты пользователя, изменившиеся с момента токена since, "
+        "и id удалённых. Без since отдаёт всю библиотеку. "
+        "Пока has_more=true, запрос повторяется с полученным token; последний token сохраняется "
+        "для следующей синхронизации. 410 — токен устарел, нужна полная синхронизация"
+    ))
+async def sync(
+    since: Optional[str] = Query(None, description="Токен предыдущей синхронизации"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    return await SyncService.get_changes(db, user.id, since, limit)
@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends
+from typing import Optional, Union
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Path, Query, Request, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import MEDIA_ACCEL_REDIRECT_PREFIX
 from app.database import get_db
+from app.negotiation import NegotiatedRoute, CatalogResponse
+from app.storage import audio_path, relative_audio_path
 from app.auth.dependencies import get_current_user
 
-from app.schemas.track import TrackCreate, TrackResponse
+from app.schemas.track import TrackCreate, TrackResponse, SimilarTrackResponse, TrackPlaylistsPage
+from app.schemas.include import TrackDocument, TrackListDocument
 from app.services.track_service import TrackService
+from app.services.play_service import play_counter, MAX_TRACK_ID
+from app.services.audio_service import AudioService
+from app.services.waveform_service import WaveformService, WAV_CONTENT_TYPES
+from app.services.catalog_service import CatalogService, get_catalog_loaders
+from app.services.include_service import IncludeService, Loaders, get_loaders, TRACK_INCLUDES
+
+router = APIRouter(prefix="/tracks", tags=["Tracks"], route_class=NegotiatedRoute)
 
-router = APIRouter(prefix="/tracks", tags=["Tracks"])
+MAX_BULK_IDS = 1000
 
 #Эндпоинт создания трека
 @router.post("/", response_model=TrackResponse,
@@ -22,36 +36,208 @@ async def create_track(
     return await TrackService.create_track(track, db, user.id)
 
 #Эндпоинт получения всех треков
-@router.get("/", response_model=list[TrackResponse],
+@router.get("/", response_model=Union[list[TrackResponse], TrackListDocument],
+    response_class=CatalogResponse,
     description=(
-        "Возвращает список всех треков " 
+        "Возвращает список всех треков. " 
+        "Параметр include=album,owner добавляет связанные ресурсы в ответ. "
+        "Accept: application/msgpack возвращает MessagePack, ответ сжимается по Accept-Encoding. "
+        "Данные могут отставать на несколько секунд"
     ))
-async def get_all_tracks(db: AsyncSession = Depends(get_db)):
-    return await TrackService.get_all_tracks(db)
+async def get_all_tracks(
+    include: Optional[str] = Query(None, description="album,owner"),
+    db: AsyncSession = Depends(get_db),
+    loaders: Loaders = Depends(get_catalog_loaders)
+):
+    relations = IncludeService.parse_include(include, TRACK_INCLUDES)
+    tracks = CatalogService.get_all_tracks()
+    if tracks is None:
+        tracks = await TrackService.get_all_tracks(db)
+    if not relations:
+        return tracks
+
+    included = await IncludeService.resolve(db, loaders, relations, tracks)
+    return TrackListDocument(data=tracks, included=included)
 
 #Эндпоинт получения треков юзера
-@router.get("/my", response_model=list[TrackResponse],
+@router.get("/my", response_model=Union[list[TrackResponse], TrackListDocument],
     summary="Get User Tracks",
     description=(
-        "Возвращает список треков пользователя "  
+        "Возвращает список треков пользователя. "  
+        "Параметр include=album,owner добавляет связанные ресурсы в ответ"
     ))
 async def get_my_tracks(
+    include: Optional[str] = Query(None, description="album,owner"),
     db: AsyncSession = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    return await TrackService.get_user_tracks(db, user.id)
+    relations = IncludeService.parse_include(include, TRACK_INCLUDES)
+    tracks = await TrackService.get_user_tracks(db, user.id)
+    if not relations:
+        return tracks
+
+    included = await IncludeService.resolve(db, loaders, relations, tracks)
+    return TrackListDocument(data=tracks, included=included)
 
 #Эндпоинт получения трека по id
-@router.get("/{track_id}", response_model=TrackResponse,
+@router.get("/{track_id}", response_model=Union[TrackResponse, TrackDocument],
     summary="Get Track by ID",
     description=(
-        "Возвращает информацию о треке " 
+        "Возвращает информацию о треке. " 
+        "Параметр include=album,owner добавляет связанные ресурсы в ответ. "
+        "Данные могут отставать на несколько секунд"
     ))
 async def get_track_by_id(
     track_id: int,
+    include: Optional[str] = Query(None, description="album,owner"),
+    db: AsyncSession = Depends(get_db),
+    loaders: Loaders = Depends(get_catalog_loaders)
+):
+    relations = IncludeService.parse_include(include, TRACK_INCLUDES)
+    # Трека, созданного после сборки снимка, в нём нет — он читается из БД
+    track = CatalogService.get_track(track_id) or await TrackService.get_track_by_id(track_id, db)
+    if not relations:
+        return track
+
+    included = await IncludeService.resolve(db, loaders, relations, [track])
+    return TrackDocument(data=track, included=included)
+
+#Эндпоинт получения похожих треков
+@router.get("/{track_id}/similar", response_model=list[SimilarTrackResponse],
+    summary="Get Similar Tracks",
+    description=(
+        "Возвращает треки, которые чаще всего встречаются в тех же плейлистах. "
+        "Список пересчитывается периодически, а не при каждом запросе"
+    ))
+async def get_similar_tracks(
+    track_id: int,
+    limit: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_db)
 ):
-    return await TrackService.get_track_by_id(track_id, db)
+    return await TrackService.get_similar_tracks(track_id, db, limit)
+
+#Эндпоинт получения плейлистов с треком
+@router.get("/{track_id}/playlists", response_model=TrackPlaylistsPage,
+    summary="Get Playlists With Track",
+    description=(
+        "Возвращает плейлисты текущего пользователя, в которых есть трек, по возрастанию id. "
+        "Следующая страница — с after=next_after. "
+        "Владельцу трека также возвращается in_playlists_count — во скольких плейлистах трек всего"
+    ))
+async def get_track_playlists(
+    track_id: int,
+    after: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    return await TrackService.get_track_playlists(track_id, db, user.id, after, limit)
+
+#Эндпоинт загрузки аудиофайла
+@router.put("/{track_id}/audio",
+    summary="Upload Track Audio",
+    description=(
+        "Загружает аудиофайл трека. Тело запроса — сам файл, Content-Type: audio/*. "
+        "Одинаковые файлы хранятся в одном экземпляре. "
+        "Для WAV в фоне строятся пики волновой формы и заполняется длительность трека. "
+        "Доступно только владельцу трека"
+    ))
+async def upload_audio(
+    track_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    result = await AudioService.upload_audio(db, track_id, request, user.id)
+    if result["content_type"] in WAV_CONTENT_TYPES:
+        background_tasks.add_task(WaveformService.process_upload, track_id, result["sha256"])
+    return result
+
+#Эндпоинт получения аудиофайла
+@router.get("/{track_id}/audio",
+    summary="Stream Track Audio",
+    response_class=FileResponse,
+    description=(
+        "Отдаёт аудиофайл трека. Поддерживает заголовок Range (ответ 206) "
+        "для перемотки в плеере"
+    ))
+async def stream_audio(
+    track_id: int,
+    db: AsyncSession = Depends(get_db, scope="function")
+):
+    # Сессия закрывается до начала отдачи файла и не держит соединение с БД
+    audio = await AudioService.get_audio(db, track_id)
+    headers = {"ETag": f'"{audio.audio_sha256}"', "Accept-Ranges": "bytes"}
+
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        # Файл отдаёт nginx через sendfile, Range он обрабатывает сам
+        headers["X-Accel-Redirect"] = f"{MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_audio_path(audio.audio_sha256)}"
+        return Response(media_type=audio.audio_content_type, headers=headers)
+
+    return FileResponse(
+        audio_path(audio.audio_sha256),
+        media_type=audio.audio_content_type,
+        headers=headers
+    )
+
+#Эндпоинт получения волновой формы
+@router.get("/{track_id}/waveform",
+    summary="Get Track Waveform",
+    response_class=Response,
+    description=(
+        "Отдаёт пики волновой формы: пары int16 (min, max), little-endian. "
+        "resolution — желаемое число пиков, выбирается ближайший уровень не меньше него. "
+        "Размер пика в сэмплах и частота дискретизации — в заголовках X-Samples-Per-Peak и X-Sample-Rate. "
+        "На If-None-Match с текущим ETag отвечает 304"
+    ))
+async def get_waveform(
+    request: Request,
+    track_id: int,
+    resolution: int = Query(1000, ge=1, le=1_000_000),
+    db: AsyncSession = Depends(get_db, scope="function")
+):
+    sha256, sample_rate, level = await WaveformService.get_waveform(db, track_id, resolution)
+    headers = {
+        "ETag": f'"{sha256}-{level.samples_per_peak}"',
+        "X-Sample-Rate": str(sample_rate),
+        "X-Samples-Per-Peak": str(level.samples_per_peak),
+        "X-Peak-Count": str(level.peak_count),
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    # memoryview отдаётся без копирования уровня в bytes
+    return Response(content=level.data, media_type="application/octet-stream", headers=headers)
+
+#Эндпоинт записи прослушивания
+@router.post("/{track_id}/play", status_code=202,
+    summary="Record Track Play",
+    description=(
+        "Засчитывает прослушивание трека. "
+        "Счётчики записываются в БД пачками, поэтому появляются в чарте с задержкой"
+    ))
+async def record_play(
+    track_id: int = Path(..., ge=1, le=MAX_TRACK_ID),
+    user=Depends(get_current_user)
+):
+    play_counter.record(track_id)
+    return {"message": "Play recorded"}
+
+#Эндпоинт массового удаления треков
+@router.delete("/",
+    summary="Delete Tracks",
+    description=(
+        "Удаляет несколько треков одним запросом: ?ids=1&ids=2. "
+        "Удаляются только треки текущего пользователя, "
+        "в ответе возвращаются id удалённых треков"
+    ))
+async def delete_tracks(
+    ids: list[int] = Query(..., max_length=MAX_BULK_IDS),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    return await TrackService.delete_tracks(ids, db, user.id)
 
 #Эндпоинт удаления трека
 @router.delete("/{track_id}",
@@ -0,0 +1,47 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+from app.schemas.playlist import PlaylistUpdate
+
+
+class BatchOperation(BaseModel):
+    op: str
+    # Имя, под которым id созданного объекта доступен следующим операциям: {"$ref": "имя"}
+    ref: Optional[str] = None
+    args: Dict[str, Any] = {}
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(min_length=1, max_length=200)
+
+
+class BatchResult(BaseModel):
+    op: str
+    ref: Optional[str] = None
+    result: Any
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
+
+# Аргументы операций, у которых нет готовой схемы в API
+class TrackIdArgs(BaseModel):
+    track_id: int
+
+
+class AlbumIdArgs(BaseModel):
+    album_id: int
+
+
+class PlaylistIdArgs(BaseModel):
+    playlist_id: int
+
+
+class PlaylistTrackArgs(BaseModel):
+    playlist_id: int
+    track_id: int
+
+
+class PlaylistUpdateArgs(PlaylistUpdate):
+    playlist_id: int
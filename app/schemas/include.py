@@ -0,0 +1,43 @@
+from pydantic import BaseModel
+from typing import List
+
+from app.schemas.album import AlbumResponse
+from app.schemas.playlist import PlaylistResponse
+from app.schemas.track import TrackResponse
+from app.schemas.user import UserPublic
+
+
+class IncludedResources(BaseModel):
+    tracks: List[TrackResponse] = []
+    users: List[UserPublic] = []
+    albums: List[AlbumResponse] = []
+
+
+class PlaylistDocument(BaseModel):
+    data: PlaylistResponse
+    included: IncludedResources
+
+
+class PlaylistListDocument(BaseModel):
+    data: List[PlaylistResponse]
+    included: IncludedResources
+
+
+class AlbumDocument(BaseModel):
+    data: AlbumResponse
+    included: IncludedResources
+
+
+class AlbumListDocument(BaseModel):
+    data: List[AlbumResponse]
+    included: IncludedResources
+
+
+class TrackDocument(BaseModel):
+    data: TrackResponse
+    included: IncludedResources
+
+
+class TrackListDocument(BaseModel):
+    data: List[TrackResponse]
+    included: IncludedResources
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 
@@ -16,6 +16,20 @@ class PlaylistUpdate(BaseModel):
     track_ids: Optional[List[int]] = None
 
 
+class PlaylistClone(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+
+class PlaylistSetOperation(PlaylistBase):
+    playlist_ids: List[int] = Field(min_length=2, max_length=100)
+
+
+class PlaylistSummary(PlaylistBase):
+    id: int
+    owner_id: int
+
+
 class PlaylistResponse(PlaylistBase):
     id: int
     owner_id: int
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import List
+
+from app.schemas.album import AlbumResponse
+from app.schemas.playlist import PlaylistResponse
+from app.schemas.track import TrackResponse
+
+
+class SyncDeleted(BaseModel):
+    tracks: List[int] = []
+    albums: List[int] = []
+    playlists: List[int] = []
+
+
+class SyncResponse(BaseModel):
+    tracks: List[TrackResponse] = []
+    albums: List[AlbumResponse] = []
+    playlists: List[PlaylistResponse] = []
+    deleted: SyncDeleted
+    token: str
+    has_more: bool
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+
+from app.schemas.playlist import PlaylistSummary
 
 class TrackBase(BaseModel):
     title: str
@@ -16,3 +18,19 @@ class TrackResponse(TrackBase):
 
     class Config:
         orm_mode = True
+
+
+class SimilarTrackResponse(TrackResponse):
+    score: float
+
+
+class ChartEntryResponse(TrackResponse):
+    rank: int
+    play_count: int
+
+
+class TrackPlaylistsPage(BaseModel):
+    playlists: List[PlaylistSummary]
+    next_after: Optional[int] = None
+    # Во скольких плейлистах (всех пользователей) трек — только для владельца трека
+    in_playlists_count: Optional[int] = None
@@ -19,3 +19,29 @@ class UserResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class UserPublic(BaseModel):
+    id: int
+    username: str
+
+    class Config:
+        orm_mode = True
+
+
+# Пользователь из claims access-токена, без запроса в БД
+class CurrentUser(BaseModel):
+    id: int
+    username: str
+    session_id: str
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+    expires_in: int
@@ -1,5 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete, bindparam
 from sqlalchemy.orm import joinedload
 from fastapi import HTTPException, status
 from datetime import date
@@ -7,14 +7,21 @@ from datetime import date
 from app.models import Album, Track
 from app.schemas.album import AlbumCreate, AlbumResponse
 
+# Готовые statement'ы горячего пути, см. app/services/track_service.py
+ALBUM_BY_TITLE = select(Album).where(
+    Album.title == bindparam("title"),
+    Album.owner_id == bindparam("user_id")
+)
+ALL_ALBUMS = select(Album).options(joinedload(Album.tracks), joinedload(Album.owner))
+ALBUM_BY_ID = ALL_ALBUMS.where(Album.id == bindparam("album_id"))
+USER_ALBUMS = ALL_ALBUMS.where(Album.owner_id == bindparam("user_id"))
+
 class AlbumService:
 
 #Функция создания альбома
     @staticmethod
     async def create_album(data: AlbumCreate, db: AsyncSession, user_id: int) -> AlbumResponse:
-        result = await db.execute(
-            select(Album).where(Album.title == data.title, Album.owner_id == user_id)
-        )
+        result = await db.execute(ALBUM_BY_TITLE, {"title": data.title, "user_id": user_id})
         existing_album = result.scalars().first()
         if existing_album:
             raise HTTPException(
@@ -30,6 +37,7 @@ class AlbumService:
         db.add(new_album)
         await db.commit()
         await db.refresh(new_album)
+        await db.refresh(new_album, ["owner"])
 
         return AlbumResponse(
             id=new_album.id,
@@ -44,11 +52,7 @@ class AlbumService:
 #Функция получения альбома по id
     @staticmethod
     async def get_album(album_id: int, db: AsyncSession) -> AlbumResponse:
-        result = await db.execute(
-            select(Album)
-            .options(joinedload(Album.tracks), joinedload(Album.owner))
-            .where(Album.id == album_id)
-        )
+        result = await db.execute(ALBUM_BY_ID, {"album_id": album_id})
         album = result.scalars().first()
         if not album:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
@@ -66,10 +70,7 @@ class AlbumService:
 #Функция получения всех альбомов
     @staticmethod
     async def get_all_albums(db: AsyncSession) -> list[AlbumResponse]:
-        result = await db.execute(
-            select(Album)
-            .options(joinedload(Album.tracks), joinedload(Album.owner))
-        )
+        result = await db.execute(ALL_ALBUMS)
         albums = result.unique().scalars().all()
 
         return [
@@ -88,11 +89,7 @@ class AlbumService:
 #Функция получения альбомов юзера
     @staticmethod
     async def get_user_albums(user_id: int, db: AsyncSession) -> list[AlbumResponse]:
-        result = await db.execute(
-            select(Album)
-            .options(joinedload(Album.tracks), joinedload(Album.owner))
-            .where(Album.owner_id == user_id)
-        )
+        result = await db.execute(USER_ALBUMS, {"user_id": user_id})
         albums = result.unique().scalars().all() 
 
         return [
@@ -111,13 +108,19 @@ class AlbumService:
 #Функция удаления альбома
     @staticmethod
     async def delete_album(album_id: int, user_id: int, db: AsyncSession):
-        result = await db.execute(select(Album).where(Album.id == album_id))
-        album = result.scalars().first()
-        if not album:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
-        if album.owner_id != user_id:
+        # album_id у треков обнуляет сама БД (ON DELETE SET NULL)
+        result = await db.execute(
+            delete(Album)
+            .where(Album.id == album_id, Album.owner_id == user_id)
+            .returning(Album.id)
+        )
+
+        if result.scalar() is None:
+            await db.rollback()
+            result = await db.execute(select(Album.id).where(Album.id == album_id))
+            if result.scalar() is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-        await db.delete(album)
         await db.commit()
         return {"message": "Album deleted"}
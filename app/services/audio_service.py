@@ -0,0 +1,76 @@
+from fastapi import HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import MAX_AUDIO_SIZE
+from app.models import Track
+from app.storage import FileTooLarge, audio_path, store_stream
+
+
+class AudioService:
+
+#Функция получения трека с проверкой владельца
+    @staticmethod
+    async def get_own_track(db: AsyncSession, track_id: int, user_id: int) -> Track:
+        result = await db.execute(select(Track).where(Track.id == track_id))
+        track = result.scalars().first()
+
+        if not track:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
+        if track.owner_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You can upload audio only for your own tracks"
+            )
+        return track
+
+#Функция загрузки аудиофайла
+    @staticmethod
+    async def upload_audio(db: AsyncSession, track_id: int, request: Request, user_id: int):
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if not content_type.startswith("audio/"):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Content-Type must be audio/*"
+            )
+
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_AUDIO_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+
+        track = await AudioService.get_own_track(db, track_id, user_id)
+        # Завершаем транзакцию, чтобы не держать соединение всё время загрузки
+        await db.commit()
+
+        try:
+            sha256, size = await store_stream(request.stream(), MAX_AUDIO_SIZE)
+        except FileTooLarge:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+
+        track.audio_sha256 = sha256
+        track.audio_size = size
+        track.audio_content_type = content_type
+        await db.commit()
+
+        return {
+            "track_id": track.id,
+            "sha256": sha256,
+            "size": size,
+            "content_type": content_type
+        }
+
+#Функция получения аудиофайла трека
+    @staticmethod
+    async def get_audio(db: AsyncSession, track_id: int):
+        result = await db.execute(
+            select(Track.id, Track.audio_sha256, Track.audio_size, Track.audio_content_type)
+            .where(Track.id == track_id)
+        )
+        track = result.first()
+
+        if not track:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
+        if not track.audio_sha256 or not audio_path(track.audio_sha256).exists():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track has no audio")
+
+        return track
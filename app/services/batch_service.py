@@ -0,0 +1,154 @@
+"""Пакетное выполнение операций API в одной транзакции.
+
+Операции выполняются по порядку теми же методами сервисов, что и обычные
+эндпоинты. Сессия привязана к соединению с уже открытой транзакцией
+(join_transaction_mode="create_savepoint"), поэтому commit и rollback внутри
+сервисов работают с SAVEPOINT, а фиксирует всё один COMMIT в конце. Ошибка
+любой операции откатывает весь пакет. События ленты изменений (pg_notify)
+доставляются только после этого COMMIT.
+
+Операция создания может объявить ref, и следующие операции подставляют id
+созданного объекта вместо значения {"$ref": "имя"} в любом месте args.
+"""
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+from app.schemas.album import AlbumCreate
+from app.schemas.batch import (
+    BatchOperation, BatchResponse, BatchResult,
+    AlbumIdArgs, PlaylistIdArgs, PlaylistTrackArgs, PlaylistUpdateArgs, TrackIdArgs,
+)
+from app.schemas.playlist import PlaylistCreate
+from app.schemas.track import TrackCreate
+from app.services.album_service import AlbumService
+from app.services.playlist_service import PlaylistService
+from app.services.track_service import TrackService
+
+REF_KEY = "$ref"
+
+# Операция -> (схема args, вызов сервиса)
+OPERATIONS = {
+    "album.create": (AlbumCreate, lambda db, args, user_id: AlbumService.create_album(args, db, user_id)),
+    "album.delete": (AlbumIdArgs, lambda db, args, user_id: AlbumService.delete_album(args.album_id, user_id, db)),
+    "track.create": (TrackCreate, lambda db, args, user_id: TrackService.create_track(args, db, user_id)),
+    "track.delete": (TrackIdArgs, lambda db, args, user_id: TrackService.delete_track(args.track_id, db, user_id)),
+    "playlist.create": (
+        PlaylistCreate, lambda db, args, user_id: PlaylistService.create_playlist(db, args, user_id)
+    ),
+    "playlist.update": (
+        PlaylistUpdateArgs,
+        lambda db, args, user_id: PlaylistService.update_playlist(
+            db, args.playlist_id, args.model_dump(exclude_unset=True, exclude={"playlist_id"}), user_id
+        )
+    ),
+    "playlist.delete": (
+        PlaylistIdArgs, lambda db, args, user_id: PlaylistService.delete_playlist(db, args.playlist_id, user_id)
+    ),
+    "playlist.add_track": (
+        PlaylistTrackArgs,
+        lambda db, args, user_id: PlaylistService.add_track_to_playlist(db, args.playlist_id, args.track_id, user_id)
+    ),
+    "playlist.remove_track": (
+        PlaylistTrackArgs,
+        lambda db, args, user_id: PlaylistService.remove_track_from_playlist(
+            db, args.playlist_id, args.track_id, user_id
+        )
+    ),
+}
+
+# Операции, результат которых — объект с id, на который можно сослаться
+CREATE_OPERATIONS = {"album.create", "track.create", "playlist.create"}
+
+
+def batch_error(status_code: int, index: int, operation: BatchOperation, detail) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail={"index": index, "op": operation.op, "detail": detail}
+    )
+
+
+def find_refs(value) -> list[str]:
+    if isinstance(value, dict):
+        if set(value) == {REF_KEY}:
+            return [value[REF_KEY]]
+        return [ref for item in value.values() for ref in find_refs(item)]
+    if isinstance(value, list):
+        return [ref for item in value for ref in find_refs(item)]
+    return []
+
+
+def resolve_refs(value, ids: dict[str, int]):
+    if isinstance(value, dict):
+        if set(value) == {REF_KEY}:
+            return ids[value[REF_KEY]]
+        return {key: resolve_refs(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_refs(item, ids) for item in value]
+    return value
+
+
+class BatchService:
+
+#Функция проверки пакета до выполнения
+    @staticmethod
+    def validate(operations: list[BatchOperation]):
+        declared = set()
+        for index, operation in enumerate(operations):
+            if operation.op not in OPERATIONS:
+                raise batch_error(
+                    status.HTTP_400_BAD_REQUEST, index, operation,
+                    f"Unknown operation. Allowed: {', '.join(OPERATIONS)}"
+                )
+            # Ссылаться можно только на операции раньше текущей
+            for ref in find_refs(operation.args):
+                if not isinstance(ref, str):
+                    raise batch_error(status.HTTP_400_BAD_REQUEST, index, operation, "Ref must be a string")
+                if ref not in declared:
+                    raise batch_error(status.HTTP_400_BAD_REQUEST, index, operation, f"Unknown ref: {ref}")
+            if operation.ref is not None:
+                if operation.op not in CREATE_OPERATIONS:
+                    raise batch_error(
+                        status.HTTP_400_BAD_REQUEST, index, operation, "Only create operations can declare a ref"
+                    )
+                if operation.ref in declared:
+                    raise batch_error(status.HTTP_400_BAD_REQUEST, index, operation, f"Duplicate ref: {operation.ref}")
+                declared.add(operation.ref)
+
+#Функция выполнения пакета операций
+    @staticmethod
+    async def run(operations: list[BatchOperation], user_id: int) -> BatchResponse:
+        BatchService.validate(operations)
+
+        ids: dict[str, int] = {}
+        results = []
+        async with engine.connect() as conn:
+            async with conn.begin():
+                async with AsyncSession(
+                    bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint"
+                ) as db:
+                    for index, operation in enumerate(operations):
+                        schema, call = OPERATIONS[operation.op]
+                        try:
+                            args = schema.model_validate(resolve_refs(operation.args, ids))
+                        except ValidationError as e:
+                            raise batch_error(
+                                status.HTTP_422_UNPROCESSABLE_ENTITY, index, operation,
+                                e.errors(include_url=False, include_context=False)
+                            )
+
+                        try:
+                            result = await call(db, args, user_id)
+                        except HTTPException as e:
+                            raise batch_error(e.status_code, index, operation, e.detail)
+
+                        if operation.ref is not None:
+                            ids[operation.ref] = result.id
+                        results.append(BatchResult(
+                            op=operation.op,
+                            ref=operation.ref,
+                            result=result.model_dump() if isinstance(result, BaseModel) else result
+                        ))
+
+        return BatchResponse(results=results)
@@ -0,0 +1,411 @@
+"""Публичный каталог из снимка на диске (см. app/catalog.py).
+
+Каждый воркер раз в CATALOG_REFRESH_INTERVAL секунд проверяет, не подменён
+ли файл снимка, и переключается на новый. Пересобирает снимок тот воркер
+хоста, который взял файловую блокировку, и только если таблицы каталога
+изменились (по счётчикам pg_stat_user_tables) или снимок старше половины
+CATALOG_MAX_AGE. Пересборка читает таблицы целиком, поэтому при постоянной
+записи она идёт не чаще раза в CATALOG_MIN_REBUILD_INTERVAL секунд, и в
+отдельном потоке со своим соединением: сборка строк не занимает event loop.
+Снимок старше CATALOG_MAX_AGE не отдаётся — запросы идут в БД.
+
+Новые объекты, которых ещё нет в снимке, читаются из БД, поэтому только что
+созданный трек сразу доступен по id. Удалённые и изменённые видны со старыми
+данными до следующей пересборки.
+"""
+import asyncio
+import logging
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import select, text, union
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+try:
+    import fcntl
+except ImportError:  # Windows: пересобирает каждый воркер
+    fcntl = None
+
+from app.catalog import NO_ALBUM, NO_DURATION, CatalogSnapshot, InvalidSnapshot, write_snapshot
+from app.config import (
+    DATABASE_URL, CATALOG_SNAPSHOT_PATH, CATALOG_REFRESH_INTERVAL, CATALOG_MAX_AGE, CATALOG_MIN_REBUILD_INTERVAL,
+)
+from app.database import engine
+from app.models import Album, Track, User
+from app.schemas.album import AlbumResponse
+from app.schemas.track import TrackResponse
+from app.schemas.user import UserPublic
+from app.services.include_service import BatchLoader, Loaders, _fetch_albums, _fetch_tracks, _fetch_users
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH = 100_000
+
+# Сумма растёт при любой вставке, изменении и удалении строк (в том числе
+# откаченных — лишняя пересборка безопасна). Счётчики обновляются после
+# завершения транзакций с задержкой до нескольких секунд
+CHANGE_MARK = text("""
+    SELECT coalesce(sum(n_tup_ins + n_tup_upd + n_tup_del), 0)::bigint
+    FROM pg_stat_user_tables
+    WHERE relid IN ('tracks'::regclass, 'albums'::regclass, 'users'::regclass)
+""")
+TRACK_ROWS = select(Track.id, Track.album_id, Track.owner_id, Track.duration, Track.title).order_by(Track.id)
+ALBUM_ROWS = select(Album.id, Album.owner_id, Album.release_date, Album.title).order_by(Album.id)
+# Только владельцы треков и альбомов — остальные пользователи каталогу не нужны
+USER_ROWS = (
+    select(User.id, User.username)
+    .where(User.id.in_(union(select(Track.owner_id), select(Album.owner_id))))
+    .order_by(User.id)
+)
+
+
+class StringHeap:
+    """Куча строк снимка. Колонка смещений начинается с start() — строки
+    одной колонки должны добавляться подряд."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def start(self) -> array:
+        return array("Q", [len(self.data)])
+
+    def append(self, offsets: array, value: str):
+        self.data += value.encode()
+        offsets.append(len(self.data))
+
+
+async def read_catalog(conn) -> tuple[dict[str, np.ndarray], int]:
+    """Колонки снимка и отметка изменений, прочитанные в одной транзакции."""
+    heap = StringHeap()
+    track_id, track_album_id, track_owner_id, track_duration = (array("i") for _ in range(4))
+    album_id, album_owner_id, album_release_date = (array("i") for _ in range(3))
+    user_id = array("i")
+
+    # Отметка читается первой: всё, что изменится после неё, поменяет её снова
+    source_mark = (await conn.execute(CHANGE_MARK)).scalar_one()
+
+    track_title = heap.start()
+    result = await conn.stream(TRACK_ROWS)
+    async for rows in result.partitions(FETCH_BATCH):
+        for t_id, t_album_id, t_owner_id, t_duration, title in rows:
+            track_id.append(t_id)
+            track_album_id.append(NO_ALBUM if t_album_id is None else t_album_id)
+            track_owner_id.append(t_owner_id)
+            track_duration.append(NO_DURATION if t_duration is None else t_duration)
+            heap.append(track_title, title)
+
+    album_title = heap.start()
+    result = await conn.stream(ALBUM_ROWS)
+    async for rows in result.partitions(FETCH_BATCH):
+        for a_id, a_owner_id, release_date, title in rows:
+            album_id.append(a_id)
+            album_owner_id.append(a_owner_id)
+            album_release_date.append(release_date.toordinal())
+            heap.append(album_title, title)
+
+    user_name = heap.start()
+    result = await conn.stream(USER_ROWS)
+    async for rows in result.partitions(FETCH_BATCH):
+        for u_id, username in rows:
+            user_id.append(u_id)
+            heap.append(user_name, username)
+
+    # Треки альбома — из колонки album_id треков: сортировка по альбому,
+    # внутри альбома остаётся порядок по id трека
+    track_ids = np.frombuffer(track_id, dtype=np.int32)
+    track_albums = np.frombuffer(track_album_id, dtype=np.int32)
+    in_album = track_albums != NO_ALBUM
+    order = np.argsort(track_albums[in_album], kind="stable")
+    sorted_albums = track_albums[in_album][order]
+    album_ids = np.frombuffer(album_id, dtype=np.int32)
+
+    columns = {
+        "track_id": track_ids,
+        "track_album_id": track_albums,
+        "track_owner_id": np.frombuffer(track_owner_id, dtype=np.int32),
+        "track_duration": np.frombuffer(track_duration, dtype=np.int32),
+        "track_title": np.frombuffer(track_title, dtype=np.uint64),
+        "album_id": album_ids,
+        "album_owner_id": np.frombuffer(album_owner_id, dtype=np.int32),
+        "album_release_date": np.frombuffer(album_release_date, dtype=np.int32),
+        "album_title": np.frombuffer(album_title, dtype=np.uint64),
+        "album_tracks": np.append(np.searchsorted(sorted_albums, album_ids), len(sorted_albums)).astype(np.uint64),
+        "album_track_ids": track_ids[in_album][order],
+        "user_id": np.frombuffer(user_id, dtype=np.int32),
+        "user_name": np.frombuffer(user_name, dtype=np.uint64),
+        "strings": np.frombuffer(heap.data, dtype=np.uint8),
+    }
+    return columns, source_mark
+
+
+def build_snapshot(path: Path) -> tuple[int, int]:
+    """Читает каталог и пишет снимок; возвращает число треков и альбомов.
+
+    Вызывается в отдельном потоке: у него свой event loop и своё соединение,
+    потому что соединения пула привязаны к loop воркера.
+    """
+    async def build():
+        build_engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+        try:
+            async with build_engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+                columns, source_mark = await read_catalog(conn)
+                await conn.commit()
+        finally:
+            await build_engine.dispose()
+        write_snapshot(path, columns, source_mark)
+        return len(columns["track_id"]), len(columns["album_id"])
+
+    return asyncio.run(build())
+
+
+def _owner_names(snapshot: CatalogSnapshot, owner_ids: Iterable[int]) -> dict[int, str]:
+    return {u_id: snapshot.text("user_name", position) for u_id, position in snapshot.find("user", owner_ids)}
+
+
+def snapshot_tracks(snapshot: CatalogSnapshot, ids: Iterable[int]) -> dict[int, TrackResponse]:
+    found = snapshot.find("track", ids)
+    columns = snapshot.columns
+    owners = _owner_names(snapshot, (int(columns["track_owner_id"][p]) for _, p in found))
+    tracks = {}
+    for t_id, position in found:
+        album_id = int(columns["track_album_id"][position])
+        duration = int(columns["track_duration"][position])
+        owner_id = int(columns["track_owner_id"][position])
+        tracks[t_id] = TrackResponse(
+            id=t_id,
+            title=snapshot.text("track_title", position),
+            duration=None if duration == NO_DURATION else duration,
+            album_id=None if album_id == NO_ALBUM else album_id,
+            owner_id=owner_id,
+            owner_name=owners[owner_id]
+        )
+    return tracks
+
+
+def snapshot_albums(snapshot: CatalogSnapshot, ids: Iterable[int]) -> dict[int, AlbumResponse]:
+    found = snapshot.find("album", ids)
+    columns = snapshot.columns
+    owners = _owner_names(snapshot, (int(columns["album_owner_id"][p]) for _, p in found))
+    albums = {}
+    for a_id, position in found:
+        owner_id = int(columns["album_owner_id"][position])
+        albums[a_id] = AlbumResponse(
+            id=a_id,
+            title=snapshot.text("album_title", position),
+            release_date=date.fromordinal(int(columns["album_release_date"][position])),
+            owner_id=owner_id,
+            owner_name=owners[owner_id],
+            track_ids=snapshot.album_track_ids(position)
+        )
+    return albums
+
+
+def snapshot_users(snapshot: CatalogSnapshot, ids: Iterable[int]) -> dict[int, UserPublic]:
+    return {
+        u_id: UserPublic(id=u_id, username=snapshot.text("user_name", position))
+        for u_id, position in snapshot.find("user", ids)
+    }
+
+
+def _usernames(snapshot: CatalogSnapshot) -> dict[int, str]:
+    return dict(zip(snapshot.columns["user_id"].tolist(), snapshot.texts("user_name")))
+
+
+class CatalogSnapshots:
+    """Текущий снимок каталога воркера и его фоновое обновление."""
+
+    def __init__(self, path: str, refresh_interval: float, max_age: float, min_rebuild_interval: float):
+        self.path = Path(path)
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        # Снимок пересобирается не реже раза в max_age / 2, поэтому интервал не больше этого
+        self.min_rebuild_interval = min(min_rebuild_interval, max_age / 2)
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.age() > self.max_age:
+            return None
+        return snapshot
+
+    def reload(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return
+        if self.snapshot is not None and self.snapshot.identity == (stat.st_dev, stat.st_ino):
+            return
+        try:
+            # Старый mmap закроется сам, когда его отпустят запросы, которые ещё его читают
+            self.snapshot = CatalogSnapshot(self.path)
+        except InvalidSnapshot:
+            # Без снимка каталог читается из БД, а следующая пересборка заменит файл
+            logger.exception("Catalog snapshot %s is invalid", self.path)
+            self.snapshot = None
+            return
+        logger.info("Catalog snapshot loaded, built %.1fs ago", self.snapshot.age())
+
+    async def rebuild(self) -> bool:
+        snapshot = self.snapshot
+        if snapshot is not None:
+            age = snapshot.age()
+            if age < self.min_rebuild_interval:
+                return False
+            if age < self.max_age / 2:
+                async with engine.connect() as conn:
+                    mark = (await conn.execute(CHANGE_MARK)).scalar_one()
+                if mark == snapshot.source_mark:
+                    return False
+
+        tracks, albums = await asyncio.to_thread(build_snapshot, self.path)
+        logger.info("Catalog snapshot rebuilt: %s tracks, %s albums", tracks, albums)
+        return True
+
+    async def refresh(self):
+        self.reload()
+        if fcntl is None:
+            await self.rebuild()
+            self.reload()
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Снимок этого хоста уже собирает другой воркер
+                return
+            try:
+                # Пока ждали блокировку, другой воркер мог успеть пересобрать
+                self.reload()
+                await self.rebuild()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.reload()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh catalog snapshot")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+catalog_snapshots = CatalogSnapshots(
+    CATALOG_SNAPSHOT_PATH, CATALOG_REFRESH_INTERVAL, CATALOG_MAX_AGE, CATALOG_MIN_REBUILD_INTERVAL
+)
+
+
+class CatalogLoaders(Loaders):
+    """Loaders, которые берут связанные ресурсы из снимка, а в БД идут только за новыми."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        super().__init__()
+        self.tracks = BatchLoader(self._with_fallback(snapshot, snapshot_tracks, _fetch_tracks))
+        self.users = BatchLoader(self._with_fallback(snapshot, snapshot_users, _fetch_users))
+        self.albums = BatchLoader(self._with_fallback(snapshot, snapshot_albums, _fetch_albums))
+
+    @staticmethod
+    def _with_fallback(snapshot, from_snapshot, from_db):
+        async def fetch(db: AsyncSession, ids: list[int]) -> dict:
+            found = from_snapshot(snapshot, ids)
+            missing = [i for i in ids if i not in found]
+            if missing:
+                found.update(await from_db(db, missing))
+            return found
+        return fetch
+
+
+def get_catalog_loaders() -> Loaders:
+    snapshot = catalog_snapshots.current()
+    return CatalogLoaders(snapshot) if snapshot is not None else Loaders()
+
+
+class CatalogService:
+
+#Функция получения всех треков из снимка
+    @staticmethod
+    def get_all_tracks() -> Optional[list[TrackResponse]]:
+        snapshot = catalog_snapshots.current()
+        if snapshot is None:
+            return None
+
+        columns = snapshot.columns
+        usernames = _usernames(snapshot)
+        return [
+            TrackResponse(
+                id=t_id,
+                title=title,
+                duration=None if duration == NO_DURATION else duration,
+                album_id=None if album_id == NO_ALBUM else album_id,
+                owner_id=owner_id,
+                owner_name=usernames[owner_id]
+            )
+            for t_id, title, duration, album_id, owner_id in zip(
+                columns["track_id"].tolist(),
+                snapshot.texts("track_title"),
+                columns["track_duration"].tolist(),
+                columns["track_album_id"].tolist(),
+                columns["track_owner_id"].tolist()
+            )
+        ]
+
+#Функция получения трека из снимка
+    @staticmethod
+    def get_track(track_id: int) -> Optional[TrackResponse]:
+        snapshot = catalog_snapshots.current()
+        if snapshot is None:
+            return None
+        return snapshot_tracks(snapshot, [track_id]).get(track_id)
+
+#Функция получения всех альбомов из снимка
+    @staticmethod
+    def get_all_albums() -> Optional[list[AlbumResponse]]:
+        snapshot = catalog_snapshots.current()
+        if snapshot is None:
+            return None
+
+        columns = snapshot.columns
+        usernames = _usernames(snapshot)
+        offsets = columns["album_tracks"].tolist()
+        track_ids = columns["album_track_ids"].tolist()
+        return [
+            AlbumResponse(
+                id=a_id,
+                title=title,
+                release_date=date.fromordinal(release_date),
+                owner_id=owner_id,
+                owner_name=usernames[owner_id],
+                track_ids=track_ids[offsets[i]:offsets[i + 1]]
+            )
+            for i, (a_id, title, release_date, owner_id) in enumerate(zip(
+                columns["album_id"].tolist(),
+                snapshot.texts("album_title"),
+                columns["album_release_date"].tolist(),
+                columns["album_owner_id"].tolist()
+            ))
+        ]
+
+#Функция получения альбома из снимка
+    @staticmethod
+    def get_album(album_id: int) -> Optional[AlbumResponse]:
+        snapshot = catalog_snapshots.current()
+        if snapshot is None:
+            return None
+        return snapshot_albums(snapshot, [album_id]).get(album_id)
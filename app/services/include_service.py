@@ -0,0 +1,161 @@
+from typing import Awaitable, Callable, Iterable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.models import Album, Track, User
+from app.schemas.album import AlbumResponse
+from app.schemas.include import IncludedResources
+from app.schemas.track import TrackResponse
+from app.schemas.user import UserPublic
+
+PLAYLIST_INCLUDES = ("tracks", "owner", "album")
+ALBUM_INCLUDES = ("tracks", "owner")
+TRACK_INCLUDES = ("album", "owner")
+
+
+class BatchLoader:
+    """Копит ключи одного типа и загружает их одним запросом `IN`.
+
+    Загруженные объекты кэшируются на время запроса, поэтому повторные
+    обращения к тем же id в БД не попадают.
+    """
+
+    def __init__(self, fetch: Callable[[AsyncSession, list[int]], Awaitable[dict]]):
+        self._fetch = fetch
+        self._pending: set[int] = set()
+        self._cache: dict = {}
+
+    def load_many(self, ids: Iterable[int]):
+        for key in ids:
+            if key is not None and key not in self._cache:
+                self._pending.add(key)
+
+    async def dispatch(self, db: AsyncSession):
+        if not self._pending:
+            return
+        keys = sorted(self._pending)
+        self._pending.clear()
+        found = await self._fetch(db, keys)
+        for key in keys:
+            self._cache[key] = found.get(key)
+
+    def get_many(self, ids: Iterable[int]) -> list:
+        seen = set()
+        items = []
+        for key in ids:
+            if key in seen:
+                continue
+            seen.add(key)
+            item = self._cache.get(key)
+            if item is not None:
+                items.append(item)
+        return items
+
+
+async def _fetch_tracks(db: AsyncSession, ids: list[int]) -> dict[int, TrackResponse]:
+    result = await db.execute(
+        select(Track).options(joinedload(Track.owner)).where(Track.id.in_(ids))
+    )
+    return {
+        t.id: TrackResponse(
+            id=t.id,
+            title=t.title,
+            duration=t.duration,
+            album_id=t.album_id,
+            owner_id=t.owner_id,
+            owner_name=t.owner.username
+        )
+        for t in result.scalars().all()
+    }
+
+
+async def _fetch_users(db: AsyncSession, ids: list[int]) -> dict[int, UserPublic]:
+    result = await db.execute(select(User.id, User.username).where(User.id.in_(ids)))
+    return {row.id: UserPublic(id=row.id, username=row.username) for row in result.all()}
+
+
+async def _fetch_albums(db: AsyncSession, ids: list[int]) -> dict[int, AlbumResponse]:
+    result = await db.execute(
+        select(Album)
+        .options(joinedload(Album.tracks), joinedload(Album.owner))
+        .where(Album.id.in_(ids))
+    )
+    return {
+        a.id: AlbumResponse(
+            id=a.id,
+            title=a.title,
+            release_date=a.release_date,
+            owner_id=a.owner_id,
+            owner_name=a.owner.username,
+            track_ids=[t.id for t in a.tracks]
+        )
+        for a in result.unique().scalars().all()
+    }
+
+
+class Loaders:
+    """Набор батчеров одного запроса: по одному на каждый тип ресурса."""
+
+    def __init__(self):
+        self.tracks = BatchLoader(_fetch_tracks)
+        self.users = BatchLoader(_fetch_users)
+        self.albums = BatchLoader(_fetch_albums)
+
+    async def dispatch(self, db: AsyncSession):
+        for loader in (self.tracks, self.users, self.albums):
+            await loader.dispatch(db)
+
+
+def get_loaders() -> Loaders:
+    return Loaders()
+
+
+class IncludeService:
+
+#Функция разбора параметра include
+    @staticmethod
+    def parse_include(include: Optional[str], allowed: tuple[str, ...]) -> set[str]:
+        if not include:
+            return set()
+
+        relations = {part.strip() for part in include.split(",") if part.strip()}
+        unknown = relations - set(allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown include: {', '.join(sorted(unknown))}. "
+                       f"Allowed: {', '.join(allowed)}"
+            )
+        return relations
+
+#Функция загрузки связанных ресурсов
+    @staticmethod
+    async def resolve(db: AsyncSession, loaders: Loaders, relations: set[str], items: list) -> IncludedResources:
+        track_ids = [t_id for item in items for t_id in getattr(item, "track_ids", [])]
+        owner_ids = [item.owner_id for item in items]
+        album_ids = [getattr(item, "album_id", None) for item in items]
+
+        if "tracks" in relations:
+            loaders.tracks.load_many(track_ids)
+        if "owner" in relations:
+            loaders.users.load_many(owner_ids)
+        if "album" in relations and track_ids:
+            # У плейлиста альбомы — это альбомы его треков: треки загружаются
+            # первыми, альбомы — следующим запросом
+            loaders.tracks.load_many(track_ids)
+            await loaders.dispatch(db)
+            album_ids += [t.album_id for t in loaders.tracks.get_many(track_ids)]
+        if "album" in relations:
+            loaders.albums.load_many(album_ids)
+
+        await loaders.dispatch(db)
+
+        return IncludedResources(
+            tracks=loaders.tracks.get_many(track_ids) if "tracks" in relations else [],
+            users=loaders.users.get_many(owner_ids) if "owner" in relations else [],
+            albums=loaders.albums.get_many(a_id for a_id in album_ids if a_id is not None)
+            if "album" in relations else [],
+        )
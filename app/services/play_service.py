@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import select, text
+
+from app.config import (
+    PLAY_FLUSH_INTERVAL, PLAY_FLUSH_MAX_PENDING, PLAY_FLUSH_MAX_BACKOFF, CHART_SIZE, CHART_REFRESH_INTERVAL,
+)
+from app.database import async_session_maker
+from app.models import Track, TrackPlay, User
+from app.schemas.track import ChartEntryResponse
+
+logger = logging.getLogger(__name__)
+
+# tracks.id — integer: больший id не закодировать в integer[] для upsert
+MAX_TRACK_ID = 2 ** 31 - 1
+
+# Несуществующие (уже удалённые) треки отсекаются JOIN'ом, а сортировка
+# по track_id задаёт одинаковый порядок блокировок во всех воркерах
+UPSERT_PLAYS = text("""
+    INSERT INTO track_plays (track_id, play_count)
+    SELECT v.track_id, v.plays
+    FROM unnest(CAST(:track_ids AS integer[]), CAST(:plays AS bigint[])) AS v (track_id, plays)
+    JOIN tracks t ON t.id = v.track_id
+    ORDER BY v.track_id
+    ON CONFLICT (track_id) DO UPDATE
+        SET play_count = track_plays.play_count + EXCLUDED.play_count
+""")
+
+
+class PlayCounter:
+    """Буфер прослушиваний в памяти воркера с периодическим сбросом в БД.
+
+    Каждый сброс — один batched upsert в track_plays. При ошибке накопленные
+    значения возвращаются в буфер, а следующий сброс откладывается с
+    экспоненциальной паузой до max_backoff секунд. Пока БД недоступна, буфер
+    не растёт дальше max_pending треков: прослушивания новых треков
+    отбрасываются и считаются в dropped.
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int, max_backoff: float):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.dropped = 0
+        self._pending: Counter = Counter()
+        self._flush_now = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, track_id: int):
+        if not 1 <= track_id <= MAX_TRACK_ID:
+            return
+        if track_id not in self._pending and len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending[track_id] += 1
+        # После ошибки сброса ждём паузу, а не повторяем на каждом запросе
+        if len(self._pending) >= self.max_pending and not self.failures:
+            self._flush_now.set()
+
+    def next_flush_delay(self) -> float:
+        if not self.failures:
+            return self.flush_interval
+        return min(self.flush_interval * 2 ** self.failures, self.max_backoff)
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, Counter()
+            track_ids = sorted(batch)
+            try:
+                async with async_session_maker() as db:
+                    await db.execute(UPSERT_PLAYS, {
+                        "track_ids": track_ids,
+                        "plays": [batch[t_id] for t_id in track_ids],
+                    })
+                    await db.commit()
+            except Exception:
+                self.failures += 1
+                self._pending.update(batch)
+                logger.exception(
+                    "Failed to flush %s play counters, retrying in %.0f s (%s plays dropped so far)",
+                    len(batch), self.next_flush_delay(), self.dropped
+                )
+            else:
+                self.failures = 0
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.next_flush_delay())
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def start(self):
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Задача не отменяется: отмена посреди flush потеряла бы уже
+        # извлечённый из буфера пакет. Цикл завершается после текущего сброса
+        if self._task is not None:
+            self._stopping.set()
+            self._flush_now.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+class TopChart:
+    """Чарт самых прослушиваемых треков, который периодически пересчитывается.
+
+    Запрос идёт по индексу (play_count DESC) и читает только CHART_SIZE строк,
+    а между пересчётами чарт отдаётся из памяти.
+    """
+
+    def __init__(self, size: int, refresh_interval: float):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.entries: list[ChartEntryResponse] = []
+        self.refreshed_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Track, User.username, TrackPlay.play_count)
+                .join(TrackPlay, TrackPlay.track_id == Track.id)
+                .join(User, User.id == Track.owner_id)
+                .order_by(TrackPlay.play_count.desc(), TrackPlay.track_id)
+                .limit(self.size)
+            )
+            rows = result.all()
+
+        self.entries = [
+            ChartEntryResponse(
+                id=t.id,
+                title=t.title,
+                duration=t.duration,
+                album_id=t.album_id,
+                owner_id=t.owner_id,
+                owner_name=username,
+                rank=rank,
+                play_count=play_count
+            )
+            for rank, (t, username, play_count) in enumerate(rows, start=1)
+        ]
+        self.refreshed_at = time.time()
+
+    async def get_top(self, limit: int) -> list[ChartEntryResponse]:
+        if self.refreshed_at is None:
+            await self.refresh()
+        return self.entries[:limit]
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh top chart")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+play_counter = PlayCounter(PLAY_FLUSH_INTERVAL, PLAY_FLUSH_MAX_PENDING, PLAY_FLUSH_MAX_BACKOFF)
+top_chart = TopChart(CHART_SIZE, CHART_REFRESH_INTERVAL)
@@ -1,9 +1,107 @@
+import json
+from typing import Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func, text, bindparam, any_, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from fastapi import HTTPException, status
 
-from app.models import Playlist, PlaylistTrack, Track
-from app.schemas.playlist import PlaylistCreate, PlaylistResponse
+from app.events import CHANNEL
+from app.models import Playlist, PlaylistTrack, Track, TrackSimilarityDirty
+from app.schemas.playlist import PlaylistCreate, PlaylistResponse, PlaylistClone
+
+# Треки результата для каждой операции: (track_id, position), порядок — как в исходных плейлистах.
+# :ids — массив id плейлистов, для разности из первого вычитаются остальные.
+# Связи читаются соединением с unnest(:ids), а не через playlist_id = ANY(:ids): так
+# каждый плейлист читается отдельным проходом по индексу, и на секционированной
+# playlist_tracks каждый проход попадает в одну секцию
+SET_OPERATION_SOURCES = {
+    "union": """
+        SELECT pt.track_id,
+               row_number() OVER (ORDER BY source.n, pt.id) AS position
+        FROM unnest(CAST(:ids AS integer[])) WITH ORDINALITY AS source (playlist_id, n)
+        JOIN playlist_tracks pt ON pt.playlist_id = source.playlist_id
+    """,
+    "intersect": """
+        SELECT pt.track_id, pt.id AS position
+        FROM playlist_tracks pt
+        WHERE pt.playlist_id = (CAST(:ids AS integer[]))[1]
+            AND pt.track_id IN (
+                SELECT other.track_id
+                FROM unnest(CAST(:ids AS integer[])) AS source (playlist_id)
+                JOIN playlist_tracks other ON other.playlist_id = source.playlist_id
+                GROUP BY other.track_id
+                HAVING count(DISTINCT other.playlist_id) = cardinality(CAST(:ids AS integer[]))
+            )
+    """,
+    "difference": """
+        SELECT pt.track_id, pt.id AS position
+        FROM playlist_tracks pt
+        WHERE pt.playlist_id = (CAST(:ids AS integer[]))[1]
+            AND NOT EXISTS (
+                SELECT 1
+                FROM unnest((CAST(:ids AS integer[]))[2:]) AS source (playlist_id)
+                JOIN playlist_tracks other ON other.playlist_id = source.playlist_id
+                WHERE other.track_id = pt.track_id
+            )
+    """,
+}
+
+# Новый плейлист, его треки и пометка треков для пересчёта похожести —
+# один statement, сколько бы треков ни было в исходных плейлистах
+COMBINE_PLAYLISTS = """
+    WITH new_playlist AS (
+        INSERT INTO playlists (name, description, owner_id)
+        VALUES (:name, :description, :owner_id)
+        RETURNING id
+    ),
+    links AS (
+        INSERT INTO playlist_tracks (playlist_id, track_id)
+        SELECT new_playlist.id, source.track_id
+        FROM new_playlist, ({source}) AS source
+        ORDER BY source.position
+        ON CONFLICT (playlist_id, track_id) DO NOTHING
+        RETURNING track_id
+    ),
+    dirty AS (
+        INSERT INTO track_similarity_dirty (track_id)
+        SELECT track_id FROM links
+        ON CONFLICT (track_id) DO UPDATE SET marked_at = now()
+    )
+    SELECT id FROM new_playlist
+"""
+
+# Готовые statement'ы горячего пути, см. app/services/track_service.py.
+# Списки id передаются одним массивом, чтобы текст запроса не зависел от их длины
+# и asyncpg переиспользовал подготовленный statement
+PLAYLIST_BY_ID = select(Playlist).where(Playlist.id == bindparam("playlist_id"))
+PLAYLIST_BY_NAME = select(Playlist.id).where(
+    Playlist.name == bindparam("name"),
+    Playlist.owner_id == bindparam("user_id")
+)
+USER_PLAYLISTS = select(Playlist).where(Playlist.owner_id == bindparam("user_id"))
+PLAYLIST_TRACK_IDS = (
+    select(PlaylistTrack.track_id)
+    .where(PlaylistTrack.playlist_id == bindparam("playlist_id"))
+    .order_by(PlaylistTrack.id)
+)
+EXISTING_TRACK_IDS = select(Track.id).where(
+    Track.id == any_(bindparam("track_ids", type_=ARRAY(Integer)))
+)
+PLAYLIST_OWNERS = select(Playlist.id, Playlist.owner_id).where(
+    Playlist.id == any_(bindparam("playlist_ids", type_=ARRAY(Integer)))
+)
+
+# События отправляются в транзакции изменения и доставляются только после коммита
+NOTIFY_PLAYLIST_EVENTS = text(
+    "SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"
+)
+
+COMBINE_STATEMENTS = {
+    operation: text(COMBINE_PLAYLISTS.format(source=source))
+    for operation, source in SET_OPERATION_SOURCES.items()
+}
 
 
 class PlaylistService:
@@ -11,7 +109,7 @@ class PlaylistService:
 #Функция получения плейлиста по id
     @staticmethod
     async def get_playlist_by_id(db: AsyncSession, playlist_id: int) -> Playlist:
-        result = await db.execute(select(Playlist).where(Playlist.id == playlist_id))
+        result = await db.execute(PLAYLIST_BY_ID, {"playlist_id": playlist_id})
         playlist = result.scalars().first()
 
         if not playlist:
@@ -31,34 +129,78 @@ class PlaylistService:
         if not track_ids:
             return
 
+        result = await db.execute(EXISTING_TRACK_IDS, {"track_ids": list(set(track_ids))})
+        existing = set(result.scalars().all())
         for track_id in track_ids:
-            result = await db.execute(select(Track).where(Track.id == track_id))
-            if not result.scalars().first():
+            if track_id not in existing:
                 raise HTTPException(
                     status_code=400,
                     detail=f"Track with id {track_id} does not exist"
                 )
             
+#Функция пометки треков для пересчёта похожести
+    @staticmethod
+    async def mark_similarity_dirty(db: AsyncSession, track_ids: list[int]):
+        if not track_ids:
+            return
+
+        stmt = pg_insert(TrackSimilarityDirty).values(
+            [{"track_id": t_id} for t_id in sorted(set(track_ids))]
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[TrackSimilarityDirty.track_id],
+            set_={"marked_at": func.now()}
+        ))
+
+#Функция пометки треков удаляемых плейлистов
+    @staticmethod
+    async def mark_playlists_dirty(db: AsyncSession, playlist_ids: list[int], user_id: int):
+        stmt = pg_insert(TrackSimilarityDirty).from_select(
+            ["track_id"],
+            select(PlaylistTrack.track_id)
+            .join(Playlist, Playlist.id == PlaylistTrack.playlist_id)
+            .where(Playlist.id.in_(playlist_ids), Playlist.owner_id == user_id)
+            .distinct()
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[TrackSimilarityDirty.track_id],
+            set_={"marked_at": func.now()}
+        ))
+
+#Функция отправки событий ленты изменений
+    @staticmethod
+    async def notify_changes(
+        db: AsyncSession,
+        event: str,
+        owner_id: int,
+        playlist_ids: list[int],
+        track_ids: Optional[list[int]] = None
+    ):
+        if not playlist_ids:
+            return
+
+        payloads = []
+        for playlist_id in playlist_ids:
+            payload = {"event": event, "playlist_id": playlist_id, "owner_id": owner_id}
+            if track_ids is not None:
+                payload["track_ids"] = track_ids
+            payloads.append(json.dumps(payload, separators=(",", ":")))
+
+        await db.execute(NOTIFY_PLAYLIST_EVENTS, {"channel": CHANNEL, "payloads": payloads})
+
 #Функция получения трека по id
     @staticmethod
     async def get_track_ids(db: AsyncSession, playlist_id: int) -> list[int]:
-        result = await db.execute(
-            select(PlaylistTrack.track_id).where(PlaylistTrack.playlist_id == playlist_id)
-        )
+        result = await db.execute(PLAYLIST_TRACK_IDS, {"playlist_id": playlist_id})
         return [row[0] for row in result.all()]
 
 
 #Функция создания плейлиста
     @staticmethod
     async def create_playlist(db: AsyncSession, data: PlaylistCreate, user_id: int) -> PlaylistResponse:
-        result = await db.execute(
-            select(Playlist).where(
-                Playlist.name == data.name,
-                Playlist.owner_id == user_id
-            )
-        )
+        result = await db.execute(PLAYLIST_BY_NAME, {"name": data.name, "user_id": user_id})
 
-        if result.scalars().first():
+        if result.first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="You already have a playlist with this title"
@@ -70,14 +212,18 @@ class PlaylistService:
             owner_id=user_id
         )
         db.add(playlist)
-        await db.commit()
-        await db.refresh(playlist)
+        # Плейлист, его треки и событие создания фиксируются одной транзакцией
+        await db.flush()
 
         if data.track_ids:
             await PlaylistService.validate_tracks_exist(db, data.track_ids)
-            for t_id in data.track_ids:
+            # Трек может входить в плейлист только один раз
+            for t_id in dict.fromkeys(data.track_ids):
                 db.add(PlaylistTrack(playlist_id=playlist.id, track_id=t_id))
-            await db.commit()
+            await PlaylistService.mark_similarity_dirty(db, data.track_ids)
+
+        await PlaylistService.notify_changes(db, "created", user_id, [playlist.id])
+        await db.commit()
 
         track_ids = await PlaylistService.get_track_ids(db, playlist.id)
         return PlaylistResponse(
@@ -89,12 +235,74 @@ class PlaylistService:
         )
 
 
+#Функция создания плейлиста из треков других плейлистов
+    @staticmethod
+    async def combine_playlists(
+        db: AsyncSession,
+        operation: str,
+        playlist_ids: list[int],
+        name: str,
+        description: Optional[str],
+        user_id: int
+    ) -> PlaylistResponse:
+        if operation != "difference":
+            # Для разности повтор первого плейлиста среди вычитаемых значим
+            playlist_ids = list(dict.fromkeys(playlist_ids))
+
+        result = await db.execute(PLAYLIST_OWNERS, {"playlist_ids": playlist_ids})
+        owners = {row.id: row.owner_id for row in result.all()}
+        for playlist_id in playlist_ids:
+            if playlist_id not in owners:
+                raise HTTPException(status_code=404, detail=f"Playlist {playlist_id} not found")
+            if owners[playlist_id] != user_id:
+                raise HTTPException(status_code=403, detail="Access denied")
+
+        result = await db.execute(PLAYLIST_BY_NAME, {"name": name, "user_id": user_id})
+        if result.first():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="You already have a playlist with this title"
+            )
+
+        result = await db.execute(COMBINE_STATEMENTS[operation], {
+            "ids": playlist_ids,
+            "name": name,
+            "description": description,
+            "owner_id": user_id,
+        })
+        new_playlist_id = result.scalar_one()
+        await PlaylistService.notify_changes(db, "created", user_id, [new_playlist_id])
+        await db.commit()
+
+        track_ids = await PlaylistService.get_track_ids(db, new_playlist_id)
+        return PlaylistResponse(
+            id=new_playlist_id,
+            name=name,
+            description=description,
+            owner_id=user_id,
+            track_ids=track_ids
+        )
+
+#Функция копирования плейлиста
+    @staticmethod
+    async def clone_playlist(db: AsyncSession, playlist_id: int, data: PlaylistClone, user_id: int):
+        playlist = await PlaylistService.get_playlist_by_id(db, playlist_id)
+        PlaylistService.check_access(playlist, user_id)
+
+        return await PlaylistService.combine_playlists(
+            db,
+            "union",
+            [playlist_id],
+            data.name or f"{playlist.name} (copy)",
+            data.description if data.description is not None else playlist.description,
+            user_id
+        )
+
+
 #Функция получения плейлистов юзера
     @staticmethod
     async def get_user_playlists(db: AsyncSession, user_id: int):
-        result = await db.execute(
-            select(Playlist).where(Playlist.owner_id == user_id)
-        )
+        result = await db.execute(USER_PLAYLISTS, {"user_id": user_id})
         playlists = result.scalars().all()
 
         response = []
@@ -159,18 +367,23 @@ class PlaylistService:
 
         if "track_ids" in data:
             track_ids = data["track_ids"]
-            await db.execute(
-                delete(PlaylistTrack).where(PlaylistTrack.playlist_id == playlist_id)
+            result = await db.execute(
+                delete(PlaylistTrack)
+                .where(PlaylistTrack.playlist_id == playlist_id)
+                .returning(PlaylistTrack.track_id)
             )
+            old_track_ids = result.scalars().all()
+            await PlaylistService.mark_similarity_dirty(db, [*old_track_ids, *(track_ids or [])])
 
             if track_ids:
                 await PlaylistService.validate_tracks_exist(db, track_ids)
-                for track_id in track_ids:
+                for track_id in dict.fromkeys(track_ids):
                     db.add(PlaylistTrack(
                         playlist_id=playlist_id,
                         track_id=track_id
                     ))
 
+        await PlaylistService.notify_changes(db, "updated", user_id, [playlist_id])
         await db.commit()
         await db.refresh(playlist)
 
@@ -188,15 +401,41 @@ class PlaylistService:
 #Функция удаления плейлиста
     @staticmethod
     async def delete_playlist(db: AsyncSession, playlist_id: int, user_id: int):
-        playlist = await PlaylistService.get_playlist_by_id(db, playlist_id)
-        PlaylistService.check_access(playlist, user_id)
+        # Связи с треками удаляет сама БД (ON DELETE CASCADE)
+        await PlaylistService.mark_playlists_dirty(db, [playlist_id], user_id)
+        result = await db.execute(
+            delete(Playlist)
+            .where(Playlist.id == playlist_id, Playlist.owner_id == user_id)
+            .returning(Playlist.id)
+        )
+
+        if result.scalar() is None:
+            await db.rollback()
+            playlist = await PlaylistService.get_playlist_by_id(db, playlist_id)
+            PlaylistService.check_access(playlist, user_id)
 
-        await db.delete(playlist)
+        await PlaylistService.notify_changes(db, "deleted", user_id, [playlist_id])
         await db.commit()
 
         return {"message": "Playlist deleted"}
 
 
+#Функция массового удаления плейлистов
+    @staticmethod
+    async def delete_playlists(db: AsyncSession, playlist_ids: list[int], user_id: int):
+        await PlaylistService.mark_playlists_dirty(db, playlist_ids, user_id)
+        result = await db.execute(
+            delete(Playlist)
+            .where(Playlist.id.in_(playlist_ids), Playlist.owner_id == user_id)
+            .returning(Playlist.id)
+        )
+        deleted_ids = sorted(result.scalars().all())
+        await PlaylistService.notify_changes(db, "deleted", user_id, deleted_ids)
+        await db.commit()
+
+        return {"deleted_ids": deleted_ids}
+
+
 #Функция добавления трека в плейлист
     @staticmethod
     async def add_track_to_playlist(db: AsyncSession, playlist_id: int, track_id: int, user_id: int):
@@ -224,6 +463,8 @@ class PlaylistService:
             track_id=track_id
         )
         db.add(new_link)
+        await PlaylistService.mark_similarity_dirty(db, [track_id])
+        await PlaylistService.notify_changes(db, "track_added", user_id, [playlist_id], [track_id])
         await db.commit()
 
         track_ids = await PlaylistService.get_track_ids(db, playlist_id)
@@ -252,6 +493,8 @@ class PlaylistService:
             raise HTTPException(status_code=404, detail="Track not in playlist")
 
         await db.delete(link)
+        await PlaylistService.mark_similarity_dirty(db, [track_id])
+        await PlaylistService.notify_changes(db, "track_removed", user_id, [playlist_id], [track_id])
         await db.commit()
 
         track_ids = await PlaylistService.get_track_ids(db, playlist_id)
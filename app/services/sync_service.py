@@ -0,0 +1,174 @@
+"""Дельта-синхронизация библиотеки пользователя.
+
+Каждая строка tracks, albums и playlists хранит версию — id транзакции,
+которая меняла её последней (ставит триггер, см. миграцию v0008). Удаления
+оставляют надгробия в sync_tombstones с той же версией. Изменения с версии
+since читаются одним диапазоном по индексу (owner_id, version) на таблицу.
+
+Версии растут в порядке начала транзакций, а не коммита, поэтому токеном
+служит xmin снимка: все транзакции младше него уже завершены. Изменения
+транзакций, которые были в полёте во время чтения, попадут в следующую
+синхронизацию — ценой того, что недавние изменения могут прийти повторно.
+
+Токен страницы — "floor.version.kind.id": floor — xmin на момент первой
+страницы, остальное — позиция, с которой продолжить.
+"""
+from collections import defaultdict
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, any_, bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Playlist, PlaylistTrack, SyncHorizon
+from app.schemas.playlist import PlaylistResponse
+from app.schemas.sync import SyncDeleted, SyncResponse
+from app.services.include_service import Loaders
+
+TRACK, ALBUM, PLAYLIST, TOMBSTONE = 1, 2, 3, 4
+
+# Ветка на таблицу: диапазон по (owner_id, version), уже отсортированный по индексу,
+# и LIMIT внутри ветки, чтобы ни одна таблица не читалась дальше страницы
+CHANGE_BRANCH = """
+    (SELECT version, {kind} AS kind, id, {entity} AS entity, {entity_id} AS entity_id
+    FROM {table}
+    WHERE owner_id = :user_id AND version >= :version
+        AND (version > :version OR {kind} > :kind OR ({kind} = :kind AND id > :id))
+    ORDER BY version, id
+    LIMIT :limit)
+"""
+
+CHANGES = text(
+    "\nUNION ALL\n".join(
+        CHANGE_BRANCH.format(kind=kind, table=table, entity=entity, entity_id=entity_id)
+        for kind, table, entity, entity_id in (
+            (TRACK, "tracks", "NULL::text", "id"),
+            (ALBUM, "albums", "NULL::text", "id"),
+            (PLAYLIST, "playlists", "NULL::text", "id"),
+            (TOMBSTONE, "sync_tombstones", "entity", "entity_id"),
+        )
+    )
+    + "\nORDER BY version, kind, id\nLIMIT :limit"
+)
+
+SNAPSHOT_XMIN = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+SYNC_HORIZON = select(SyncHorizon.version)
+
+PLAYLISTS_BY_IDS = select(
+    Playlist.id, Playlist.name, Playlist.description, Playlist.owner_id
+).where(Playlist.id == any_(bindparam("ids", type_=ARRAY(Integer))))
+
+# Фильтр по playlists.id, а связи — соединением: каждый плейлист читается своим
+# проходом по индексу (и своей секцией, если playlist_tracks секционирована)
+PLAYLISTS_TRACK_IDS = (
+    select(PlaylistTrack.playlist_id, PlaylistTrack.track_id)
+    .join(Playlist, Playlist.id == PlaylistTrack.playlist_id)
+    .where(Playlist.id == any_(bindparam("ids", type_=ARRAY(Integer))))
+    .order_by(PlaylistTrack.id)
+)
+
+
+def parse_token(token: Optional[str]) -> tuple[Optional[int], tuple[int, int, int]]:
+    """Токен -> (floor или None, позиция (version, kind, id))."""
+    if not token:
+        return None, (0, 0, 0)
+    try:
+        parts = [int(part) for part in token.split(".")]
+    except ValueError:
+        parts = []
+    if len(parts) == 1:
+        return None, (parts[0], 0, 0)
+    if len(parts) == 4:
+        return parts[0], (parts[1], parts[2], parts[3])
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid sync token"
+    )
+
+
+class SyncService:
+
+#Функция получения изменений библиотеки с момента токена
+    @staticmethod
+    async def get_changes(db: AsyncSession, user_id: int, since: Optional[str], limit: int) -> SyncResponse:
+        floor, (version, kind, entity_id) = parse_token(since)
+
+        if since:
+            horizon = (await db.execute(SYNC_HORIZON)).scalar() or 0
+            if (floor if floor is not None else version) < horizon:
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="Sync token is too old, full sync required"
+                )
+
+        # xmin берём до чтения изменений: более поздний снимок его не уменьшит
+        xmin = (await db.execute(SNAPSHOT_XMIN)).scalar_one()
+        if floor is None:
+            floor = xmin
+
+        result = await db.execute(CHANGES, {
+            "user_id": user_id,
+            "version": version,
+            "kind": kind,
+            "id": entity_id,
+            "limit": limit + 1,
+        })
+        rows = result.all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        changed = defaultdict(list)
+        deleted = defaultdict(list)
+        for row in rows:
+            if row.kind == TOMBSTONE:
+                deleted[row.entity].append(row.entity_id)
+            else:
+                changed[row.kind].append(row.id)
+
+        loaders = Loaders()
+        loaders.tracks.load_many(changed[TRACK])
+        loaders.albums.load_many(changed[ALBUM])
+        await loaders.dispatch(db)
+
+        if has_more:
+            last = rows[-1]
+            token = f"{floor}.{last.version}.{last.kind}.{last.id}"
+        else:
+            token = str(floor)
+
+        return SyncResponse(
+            tracks=loaders.tracks.get_many(changed[TRACK]),
+            albums=loaders.albums.get_many(changed[ALBUM]),
+            playlists=await SyncService._fetch_playlists(db, changed[PLAYLIST]),
+            deleted=SyncDeleted(
+                tracks=deleted["track"],
+                albums=deleted["album"],
+                playlists=deleted["playlist"]
+            ),
+            token=token,
+            has_more=has_more
+        )
+
+#Функция загрузки плейлистов вместе с составом
+    @staticmethod
+    async def _fetch_playlists(db: AsyncSession, ids: list[int]) -> list[PlaylistResponse]:
+        if not ids:
+            return []
+        playlists = (await db.execute(PLAYLISTS_BY_IDS, {"ids": ids})).all()
+
+        track_ids = defaultdict(list)
+        for link in (await db.execute(PLAYLISTS_TRACK_IDS, {"ids": ids})).all():
+            track_ids[link.playlist_id].append(link.track_id)
+
+        return [
+            PlaylistResponse(
+                id=p.id,
+                name=p.name,
+                description=p.description,
+                owner_id=p.owner_id,
+                track_ids=track_ids[p.id]
+            )
+            for p in playlists
+        ]
@@ -0,0 +1,130 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, func, bindparam, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.jwt_handler import create_access_token, create_refresh_token, decode_refresh_token
+from app.auth.revocation import revocation_filter
+from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+from app.models import User, RefreshToken, SessionRevocation
+
+# Проверка выполняется на каждый токен из фильтра отозванных, поэтому statement готовый
+SESSION_REVOKED = select(SessionRevocation.session_id).where(
+    SessionRevocation.session_id == bindparam("session_id")
+)
+
+# Обмен refresh-токена и отзыв сессии берут блокировку сессии до конца транзакции.
+# Без неё обмен, идущий одновременно с logout, выдал бы новый refresh-токен,
+# которого UPDATE отзыва уже не видит, и сессия ожила бы
+SESSION_LOCK_CLASS = 37
+LOCK_SESSION = text("SELECT pg_advisory_xact_lock(:lock_class, hashtext(:session_id))")
+
+
+async def lock_session(db: AsyncSession, session_id: str):
+    await db.execute(LOCK_SESSION, {"lock_class": SESSION_LOCK_CLASS, "session_id": session_id})
+
+
+class TokenService:
+
+#Функция выдачи пары access/refresh токенов
+    @staticmethod
+    async def issue_tokens(db: AsyncSession, user_id: int, username: str, session_id: Optional[str] = None):
+        session_id = session_id or str(uuid.uuid4())
+        jti = str(uuid.uuid4())
+
+        db.add(RefreshToken(
+            jti=jti,
+            user_id=user_id,
+            session_id=session_id,
+            expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        ))
+        await db.commit()
+
+        claims = {"sub": str(user_id), "sid": session_id}
+        return {
+            "access_token": create_access_token({**claims, "username": username}),
+            "refresh_token": create_refresh_token({**claims, "jti": jti}),
+            "token_type": "bearer",
+            "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        }
+
+#Функция обмена refresh-токена на новую пару
+    @staticmethod
+    async def refresh_tokens(db: AsyncSession, refresh_token: str):
+        payload = decode_refresh_token(refresh_token)
+        # Если сессию уже отозвали, токен к этому моменту помечен использованным
+        if payload.get("sid"):
+            await lock_session(db, payload["sid"])
+
+        # Токен одноразовый: помечаем использованным тем же запросом, что и проверяем
+        result = await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.jti == payload.get("jti"),
+                RefreshToken.used_at.is_(None),
+                RefreshToken.expires_at > func.now()
+            )
+            .values(used_at=func.now())
+            .returning(RefreshToken.user_id, RefreshToken.session_id)
+        )
+        row = result.first()
+
+        if not row:
+            # Повторное предъявление значит, что токен мог утечь, — закрываем всю сессию
+            await db.rollback()
+            if payload.get("sid"):
+                await TokenService.revoke_sessions(db, [payload["sid"]])
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token is invalid or already used"
+            )
+
+        result = await db.execute(select(User.username).where(User.id == row.user_id))
+        username = result.scalar_one()
+        return await TokenService.issue_tokens(db, row.user_id, username, row.session_id)
+
+#Функция отзыва сессий
+    @staticmethod
+    async def revoke_sessions(db: AsyncSession, session_ids: list[str]):
+        if not session_ids:
+            return
+        # Запись о сессии нужна, только пока могут быть живы её access-токены
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # В одном порядке во всех транзакциях, чтобы не было взаимных блокировок
+        for session_id in sorted(set(session_ids)):
+            await lock_session(db, session_id)
+        await db.execute(
+            pg_insert(SessionRevocation)
+            .values([{"session_id": s_id, "expires_at": expires_at} for s_id in session_ids])
+            .on_conflict_do_nothing()
+        )
+        await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.session_id.in_(session_ids), RefreshToken.used_at.is_(None))
+            .values(used_at=func.now())
+        )
+        await db.commit()
+        for session_id in session_ids:
+            revocation_filter.add(session_id)
+
+#Функция отзыва всех сессий пользователя
+    @staticmethod
+    async def revoke_user_sessions(db: AsyncSession, user_id: int):
+        result = await db.execute(
+            select(RefreshToken.session_id)
+            .where(RefreshToken.user_id == user_id, RefreshToken.expires_at > func.now())
+            .distinct()
+        )
+        session_ids = result.scalars().all()
+        await TokenService.revoke_sessions(db, session_ids)
+        return {"revoked_sessions": len(session_ids)}
+
+#Функция точной проверки отзыва сессии
+    @staticmethod
+    async def is_session_revoked(db: AsyncSession, session_id: str) -> bool:
+        result = await db.execute(SESSION_REVOKED, {"session_id": session_id})
+        return result.first() is not None
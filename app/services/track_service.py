@@ -1,22 +1,57 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete, bindparam, func
 from fastapi import HTTPException, status
-from app.models import Track, Album, User
-from app.schemas.track import TrackCreate, TrackResponse
+from app.models import Track, Album, User, TrackSimilarity, Playlist, PlaylistTrack
+from app.schemas.playlist import PlaylistSummary
+from app.schemas.track import TrackCreate, TrackResponse, SimilarTrackResponse, TrackPlaylistsPage
 from sqlalchemy.orm import joinedload
 
+# Запросы горячего пути собираются один раз: SQLAlchemy запоминает ключ кэша
+# готового statement, так что на вызов остаются только параметры
+TRACK_BY_TITLE = select(Track).where(
+    Track.title == bindparam("title"),
+    Track.owner_id == bindparam("user_id")
+)
+ALBUM_BY_ID = select(Album).where(Album.id == bindparam("album_id"))
+ALL_TRACKS = select(Track).options(joinedload(Track.owner))
+USER_TRACKS = ALL_TRACKS.where(Track.owner_id == bindparam("user_id"))
+TRACK_BY_ID = ALL_TRACKS.where(Track.id == bindparam("track_id"))
+SIMILAR_TRACKS = (
+    select(Track, User.username, TrackSimilarity.score)
+    .join(TrackSimilarity, TrackSimilarity.similar_track_id == Track.id)
+    .join(User, User.id == Track.owner_id)
+    .where(TrackSimilarity.track_id == bindparam("track_id"))
+    .order_by(TrackSimilarity.rank)
+    .limit(bindparam("limit"))
+)
+TRACK_OWNER = select(Track.owner_id).where(Track.id == bindparam("track_id"))
+# Связи читаются по индексу (track_id, playlist_id) уже в порядке playlist_id,
+# поэтому страница после after — продолжение того же диапазона
+TRACK_PLAYLISTS = (
+    select(Playlist.id, Playlist.name, Playlist.description, Playlist.owner_id)
+    .join(PlaylistTrack, PlaylistTrack.playlist_id == Playlist.id)
+    .where(
+        PlaylistTrack.track_id == bindparam("track_id"),
+        PlaylistTrack.playlist_id > bindparam("after"),
+        Playlist.owner_id == bindparam("user_id")
+    )
+    .order_by(PlaylistTrack.playlist_id)
+    .limit(bindparam("limit"))
+)
+# Считается по тому же индексу (index-only scan), без чтения таблицы
+TRACK_PLAYLISTS_COUNT = (
+    select(func.count())
+    .select_from(PlaylistTrack)
+    .where(PlaylistTrack.track_id == bindparam("track_id"))
+)
+
 
 class TrackService:
 
 #Функция создания трека
     @staticmethod
     async def create_track(data: TrackCreate, db: AsyncSession, user_id: int):
-        result = await db.execute(
-        select(Track).where(
-            Track.title == data.title,
-            Track.owner_id == user_id
-            )
-        )
+        result = await db.execute(TRACK_BY_TITLE, {"title": data.title, "user_id": user_id})
         existing = result.scalars().first()
 
         if existing:
@@ -26,7 +61,7 @@ class TrackService:
             )
     
         if data.album_id is not None:
-            result = await db.execute(select(Album).where(Album.id == data.album_id))
+            result = await db.execute(ALBUM_BY_ID, {"album_id": data.album_id})
             album = result.scalars().first()
             if not album:
                 raise HTTPException(
@@ -44,7 +79,8 @@ class TrackService:
         db.add(new_track)
         await db.commit()
         await db.refresh(new_track)
-        await db.refresh(new_track.owner) 
+        # Владелец больше не лежит в сессии после get_current_user — подгружаем явно
+        await db.refresh(new_track, ["owner"])
 
         return TrackResponse(
             id=new_track.id,
@@ -59,9 +95,7 @@ class TrackService:
 #Функция получения всех треков
     @staticmethod
     async def get_all_tracks(db: AsyncSession):
-        result = await db.execute(
-            select(Track).options(joinedload(Track.owner))
-        )
+        result = await db.execute(ALL_TRACKS)
         tracks = result.scalars().all()
 
         responses = [
@@ -80,33 +114,27 @@ class TrackService:
 #Функция получения треков юзера
     @staticmethod
     async def get_user_tracks(db: AsyncSession, user_id: int):
-        result = await db.execute(select(Track).where(Track.owner_id == user_id))
+        result = await db.execute(USER_TRACKS, {"user_id": user_id})
         tracks = result.scalars().all()
 
-        responses = []
-        for t in tracks:
-            await db.refresh(t.owner)
-            responses.append(
-                TrackResponse(
-                    id=t.id,
-                    title=t.title,
-                    duration=t.duration,
-                    album_id=t.album_id,
-                    owner_id=t.owner_id,
-                    owner_name=t.owner.username
-                )
+        responses = [
+            TrackResponse(
+                id=t.id,
+                title=t.title,
+                duration=t.duration,
+                album_id=t.album_id,
+                owner_id=t.owner_id,
+                owner_name=t.owner.username
             )
+            for t in tracks
+        ]
         return responses
 
 
 #Функция получения трека по id
     @staticmethod
     async def get_track_by_id(track_id: int, db: AsyncSession):
-        result = await db.execute(
-            select(Track)
-            .options(joinedload(Track.owner))
-            .where(Track.id == track_id)
-        )
+        result = await db.execute(TRACK_BY_ID, {"track_id": track_id})
         track = result.scalars().first()
 
         if not track:
@@ -128,18 +156,100 @@ class TrackService:
 #Функция удаления трека
     @staticmethod
     async def delete_track(track_id: int, db: AsyncSession, user_id: int):
-        track_response = await TrackService.get_track_by_id(track_id, db)
+        # Связи с плейлистами удаляет сама БД (ON DELETE CASCADE)
+        result = await db.execute(
+            delete(Track)
+            .where(Track.id == track_id, Track.owner_id == user_id)
+            .returning(Track.id)
+        )
 
-        if track_response.owner_id != user_id:
+        if result.scalar() is None:
+            await db.rollback()
+            result = await db.execute(select(Track.id).where(Track.id == track_id))
+            if result.scalar() is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Track not found"
+                )
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can delete only your own tracks"
             )
 
-        result = await db.execute(select(Track).where(Track.id == track_id))
-        track = result.scalars().first()
-
-        await db.delete(track)
         await db.commit()
 
         return {"message": "Track deleted"}
+
+
+#Функция массового удаления треков
+    @staticmethod
+    async def delete_tracks(track_ids: list[int], db: AsyncSession, user_id: int):
+        result = await db.execute(
+            delete(Track)
+            .where(Track.id.in_(track_ids), Track.owner_id == user_id)
+            .returning(Track.id)
+        )
+        deleted_ids = sorted(result.scalars().all())
+        await db.commit()
+
+        return {"deleted_ids": deleted_ids}
+
+
+#Функция получения похожих треков
+    @staticmethod
+    async def get_similar_tracks(track_id: int, db: AsyncSession, limit: int) -> list[SimilarTrackResponse]:
+        # Похожие треки заранее посчитаны джобой app.jobs.similarity
+        result = await db.execute(SIMILAR_TRACKS, {"track_id": track_id, "limit": limit})
+        rows = result.all()
+
+        if not rows:
+            await TrackService.get_track_by_id(track_id, db)
+
+        return [
+            SimilarTrackResponse(
+                id=t.id,
+                title=t.title,
+                duration=t.duration,
+                album_id=t.album_id,
+                owner_id=t.owner_id,
+                owner_name=username,
+                score=score
+            )
+            for t, username, score in rows
+        ]
+
+#Функция получения плейлистов пользователя, в которых есть трек
+    @staticmethod
+    async def get_track_playlists(
+        track_id: int, db: AsyncSession, user_id: int, after: int, limit: int
+    ) -> TrackPlaylistsPage:
+        result = await db.execute(TRACK_OWNER, {"track_id": track_id})
+        owner_id = result.scalar()
+        if owner_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Track not found"
+            )
+
+        result = await db.execute(TRACK_PLAYLISTS, {
+            "track_id": track_id,
+            "after": after,
+            "user_id": user_id,
+            "limit": limit + 1
+        })
+        rows = result.all()
+        playlists = [
+            PlaylistSummary(id=p.id, name=p.name, description=p.description, owner_id=p.owner_id)
+            for p in rows[:limit]
+        ]
+
+        in_playlists_count = None
+        if owner_id == user_id:
+            result = await db.execute(TRACK_PLAYLISTS_COUNT, {"track_id": track_id})
+            in_playlists_count = result.scalar_one()
+
+        return TrackPlaylistsPage(
+            playlists=playlists,
+            next_after=playlists[-1].id if len(rows) > limit else None,
+            in_playlists_count=in_playlists_count
+        )
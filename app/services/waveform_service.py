@@ -0,0 +1,63 @@
+import logging
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.database import async_session_maker
+from app.models import Track
+from app.storage import audio_path
+from app.waveform import UnsupportedAudio, generate_peaks, peaks_path, read_header, read_level
+
+logger = logging.getLogger(__name__)
+
+WAV_CONTENT_TYPES = {"audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave"}
+
+
+class WaveformService:
+
+#Функция построения пиков после загрузки аудио
+    @staticmethod
+    async def process_upload(track_id: int, sha256: str):
+        audio_file = audio_path(sha256)
+        try:
+            if peaks_path(audio_file).exists():
+                # Этот файл уже обрабатывали для другого трека
+                sample_rate, frames = await run_in_threadpool(read_header, peaks_path(audio_file))
+            else:
+                sample_rate, frames = await run_in_threadpool(generate_peaks, audio_file)
+        except UnsupportedAudio as exc:
+            logger.warning("Cannot build waveform for track %s: %s", track_id, exc)
+            return
+
+        async with async_session_maker() as db:
+            # Трек мог успеть получить другой файл — обновляем только если нет
+            await db.execute(
+                update(Track)
+                .where(Track.id == track_id, Track.audio_sha256 == sha256)
+                .values(duration=round(frames / sample_rate))
+            )
+            await db.commit()
+
+#Функция получения пиков трека
+    @staticmethod
+    async def get_waveform(db: AsyncSession, track_id: int, resolution: int):
+        result = await db.execute(select(Track.audio_sha256).where(Track.id == track_id))
+        row = result.first()
+
+        if not row:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
+
+        if not row.audio_sha256:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform is not available")
+
+        # open и mmap — системные вызовы, они выполняются вне event loop
+        try:
+            sample_rate, level = await run_in_threadpool(read_level, peaks_path(audio_path(row.audio_sha256)), resolution)
+        except FileNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform is not available")
+        except UnsupportedAudio as exc:
+            logger.warning("Cannot read waveform for track %s: %s", track_id, exc)
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform is not available")
+        return row.audio_sha256, sample_rate, level
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import MEDIA_ROOT
+
+AUDIO_DIR = Path(MEDIA_ROOT) / "audio"
+TMP_DIR = Path(MEDIA_ROOT) / "tmp"
+
+# Запись на диск идёт блоками по 1 МиБ, чтобы не гонять поток ради каждого чанка
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def audio_path(sha256: str) -> Path:
+    return AUDIO_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def relative_audio_path(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def _write(file, hasher, data: bytearray):
+    hasher.update(data)
+    file.write(data)
+
+
+def _publish(tmp_path: Path, sha256: str):
+    final_path = audio_path(sha256)
+    if final_path.exists():
+        # Такой файл уже загружали — храним одну копию
+        tmp_path.unlink()
+        return
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, final_path)
+
+
+async def store_stream(chunks: AsyncIterator[bytes], max_size: int) -> tuple[str, int]:
+    """Сохраняет поток в content-addressed хранилище, возвращает (sha256, размер).
+
+    Файл пишется во временный каталог на той же файловой системе и атомарно
+    переносится на место, поэтому читатели никогда не видят недописанный файл.
+    """
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = TMP_DIR / uuid.uuid4().hex
+    hasher = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+
+    file = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLarge()
+            buffer += chunk
+            if len(buffer) >= WRITE_BUFFER_SIZE:
+                data, buffer = buffer, bytearray()
+                await run_in_threadpool(_write, file, hasher, data)
+        if buffer:
+            await run_in_threadpool(_write, file, hasher, buffer)
+        await run_in_threadpool(file.close)
+    except BaseException:
+        file.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    sha256 = hasher.hexdigest()
+    await run_in_threadpool(_publish, tmp_path, sha256)
+    return sha256, size
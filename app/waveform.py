@@ -0,0 +1,219 @@
+"""Пики волновой формы для превью в плеере.
+
+Файл пиков (.peaks) лежит рядом с аудио и содержит несколько уровней
+детализации. Формат (little-endian):
+
+    заголовок   4s magic "WPK1", H версия, H число уровней,
+                I частота дискретизации, Q число сэмплов на канал
+    уровни      на каждый: I сэмплов на пик, I число пиков, Q смещение данных
+    данные      int16 пары (min, max) для каждого пика
+
+Читается файл через mmap, так что отдача уровня не требует ни пересчёта,
+ни загрузки остальных уровней в память.
+"""
+import mmap
+import os
+import struct
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"WPK1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")
+LEVEL = struct.Struct("<IIQ")
+
+# Самый детальный уровень — пик на 256 сэмплов, каждый следующий в 4 раза грубее
+BASE_SAMPLES_PER_PEAK = 256
+LEVEL_FACTOR = 4
+MIN_PEAKS_PER_LEVEL = 64
+
+# Сколько пиков базового уровня считается за один проход по файлу
+BLOCKS_PER_CHUNK = 4096
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class UnsupportedAudio(Exception):
+    pass
+
+
+@dataclass
+class PcmData:
+    samples: np.ndarray  # (кадры, каналы), memmap поверх файла
+    sample_rate: int
+    frames: int
+
+
+@dataclass
+class PeakLevel:
+    samples_per_peak: int
+    peak_count: int
+    data: memoryview  # int16 пары (min, max)
+
+
+def peaks_path(audio_path: Path) -> Path:
+    return audio_path.with_name(audio_path.name + ".peaks")
+
+
+def read_wav(path: Path) -> PcmData:
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise UnsupportedAudio("Not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise UnsupportedAudio("No data chunk")
+            chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+            elif chunk_id == b"data":
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size, os.SEEK_CUR)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)
+
+    if fmt is None or len(fmt) < 16:
+        raise UnsupportedAudio("No fmt chunk")
+
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if not channels or not sample_rate or not block_align:
+        raise UnsupportedAudio("Broken fmt chunk")
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+
+    if format_tag == WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        dtype = {8: np.uint8, 16: np.int16, 32: np.int32}[bits]
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        dtype = np.float32
+    else:
+        raise UnsupportedAudio(f"Unsupported WAV encoding: format {format_tag}, {bits} bit")
+
+    if block_align != channels * np.dtype(dtype).itemsize:
+        raise UnsupportedAudio("Broken fmt chunk: block align does not match channels and sample size")
+
+    # Размер data бывает записан неверно (потоковая запись) — ориентируемся на файл
+    file_size = os.path.getsize(path)
+    frames = (min(chunk_size, file_size - data_offset)) // block_align
+    if frames <= 0:
+        raise UnsupportedAudio("Empty data chunk")
+    samples = np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(frames, channels))
+    return PcmData(samples=samples, sample_rate=sample_rate, frames=frames)
+
+
+def _to_int16(values: np.ndarray) -> np.ndarray:
+    if values.dtype == np.int16:
+        return values
+    if values.dtype == np.uint8:
+        return ((values.astype(np.int16) - 128) << 8).astype(np.int16)
+    if values.dtype == np.int32:
+        return (values >> 16).astype(np.int16)
+    return (np.clip(values, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def compute_peaks(pcm: PcmData) -> list[np.ndarray]:
+    """Возвращает уровни пиков: массивы формы (число пиков, 2) с парами (min, max)."""
+    base_count = -(-pcm.frames // BASE_SAMPLES_PER_PEAK)
+    base = np.empty((base_count, 2), dtype=np.int16)
+    chunk_frames = BASE_SAMPLES_PER_PEAK * BLOCKS_PER_CHUNK
+
+    for block_start, frame_start in enumerate(range(0, pcm.frames, chunk_frames)):
+        chunk = np.asarray(pcm.samples[frame_start:frame_start + chunk_frames])
+        blocks = -(-len(chunk) // BASE_SAMPLES_PER_PEAK)
+        padded = blocks * BASE_SAMPLES_PER_PEAK
+        if padded != len(chunk):
+            # Хвост дополняем последним сэмплом, чтобы не исказить min/max
+            chunk = np.concatenate([chunk, np.repeat(chunk[-1:], padded - len(chunk), axis=0)])
+
+        # Каналы сводятся в один: берём крайние значения по всем каналам
+        grouped = chunk.reshape(blocks, -1)
+        offset = block_start * BLOCKS_PER_CHUNK
+        base[offset:offset + blocks, 0] = _to_int16(grouped.min(axis=1))
+        base[offset:offset + blocks, 1] = _to_int16(grouped.max(axis=1))
+
+    levels = [base]
+    while len(levels[-1]) >= MIN_PEAKS_PER_LEVEL * LEVEL_FACTOR:
+        previous = levels[-1]
+        count = len(previous) // LEVEL_FACTOR
+        grouped = previous[:count * LEVEL_FACTOR].reshape(count, LEVEL_FACTOR, 2)
+        level = np.empty((count, 2), dtype=np.int16)
+        level[:, 0] = grouped[:, :, 0].min(axis=1)
+        level[:, 1] = grouped[:, :, 1].max(axis=1)
+        levels.append(level)
+    return levels
+
+
+def write_peaks(path: Path, levels: list[np.ndarray], sample_rate: int, frames: int):
+    offset = HEADER.size + LEVEL.size * len(levels)
+    table = []
+    for i, level in enumerate(levels):
+        table.append(LEVEL.pack(BASE_SAMPLES_PER_PEAK * LEVEL_FACTOR ** i, len(level), offset))
+        offset += level.nbytes
+
+    # Уникальное имя: один и тот же файл могут обрабатывать две загрузки сразу
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(levels), sample_rate, frames))
+            f.writelines(table)
+            for level in levels:
+                f.write(level.astype("<i2").tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def generate_peaks(audio_file: Path) -> tuple[int, int]:
+    """Считает и сохраняет пики для WAV-файла, возвращает (частота, число сэмплов)."""
+    pcm = read_wav(audio_file)
+    write_peaks(peaks_path(audio_file), compute_peaks(pcm), pcm.sample_rate, pcm.frames)
+    return pcm.sample_rate, pcm.frames
+
+
+def read_header(path: Path) -> tuple[int, int]:
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise UnsupportedAudio("Truncated peaks file")
+    magic, version, _, sample_rate, frames = HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION or not sample_rate:
+        raise UnsupportedAudio("Unknown peaks file format")
+    return sample_rate, frames
+
+
+def read_level(path: Path, resolution: int) -> tuple[int, PeakLevel]:
+    """Выбирает самый грубый уровень, где пиков не меньше resolution.
+
+    Если такого нет, отдаётся самый детальный уровень.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise UnsupportedAudio("Truncated peaks file")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, level_count, sample_rate, _ = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != FORMAT_VERSION or not level_count:
+        raise UnsupportedAudio("Unknown peaks file format")
+    if HEADER.size + level_count * LEVEL.size > len(mapped):
+        raise UnsupportedAudio("Truncated peaks file")
+
+    levels = [LEVEL.unpack_from(mapped, HEADER.size + i * LEVEL.size) for i in range(level_count)]
+    suitable = [level for level in levels if level[1] >= resolution]
+    samples_per_peak, peak_count, offset = suitable[-1] if suitable else levels[0]
+    if offset + peak_count * 4 > len(mapped):
+        raise UnsupportedAudio("Truncated peaks file")
+
+    # Срез не копирует данные: тело ответа читается прямо из отображения файла
+    data = memoryview(mapped)[offset:offset + peak_count * 4]
+    return sample_rate, PeakLevel(samples_per_peak, peak_count, data)
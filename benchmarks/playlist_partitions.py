@@ -0,0 +1,193 @@
+"""Запросы сервиса плейлистов к обычной и секционированной playlist_tracks.
+
+    python -m benchmarks.playlist_partitions --links 100000000 --partitions 64
+    python -m benchmarks.playlist_partitions --skip-load     # таблицы уже заполнены
+
+В базе DATABASE_URL создаются схемы bench_plain и bench_hashed с таблицей
+playlist_tracks одинаковой структуры (ключи и индексы — как у приложения),
+во второй — с хэш-секциями по playlist_id. Запросы берутся прямо из
+PlaylistService и выполняются с search_path на нужную схему. Для каждого
+выводится медианное время и сколько секций реально читалось (по EXPLAIN ANALYZE
+generic-плана: сканирования, выполнявшиеся хотя бы раз). Загрузка 100M
+связей занимает десятки минут и около 25 ГБ на диске на обе схемы.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import bindparam, delete, select, text
+
+from app.database import engine
+from app.models import PlaylistTrack
+from app.services.playlist_service import PLAYLIST_TRACK_IDS, SET_OPERATION_SOURCES
+
+SCHEMAS = ("bench_plain", "bench_hashed")
+LOAD_BATCH = 10_000_000
+
+# Проверка связи перед добавлением и удаление связи по ключу — как в add/remove_track
+LINK_EXISTS = select(PlaylistTrack.id).where(
+    PlaylistTrack.playlist_id == bindparam("playlist_id"),
+    PlaylistTrack.track_id == bindparam("track_id")
+)
+REMOVE_LINK = delete(PlaylistTrack).where(
+    PlaylistTrack.id == bindparam("id"),
+    PlaylistTrack.playlist_id == bindparam("playlist_id")
+)
+
+
+def create_statements(schema: str, partitions: int) -> list[str]:
+    partitioned = schema == "bench_hashed"
+    statements = [
+        f"DROP SCHEMA IF EXISTS {schema} CASCADE",
+        f"CREATE SCHEMA {schema}",
+        f"""
+        CREATE TABLE {schema}.playlist_tracks (
+            id INTEGER NOT NULL,
+            playlist_id INTEGER NOT NULL,
+            track_id INTEGER
+        ) {"PARTITION BY HASH (playlist_id)" if partitioned else ""}
+        """,
+    ]
+    if partitioned:
+        statements += [
+            f"""
+            CREATE TABLE {schema}.playlist_tracks_p{remainder:03d} PARTITION OF {schema}.playlist_tracks
+                FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+            """
+            for remainder in range(partitions)
+        ]
+    return statements
+
+
+def index_statements(schema: str) -> list[str]:
+    key = "(playlist_id, id)" if schema == "bench_hashed" else "(id)"
+    return [
+        f"ALTER TABLE {schema}.playlist_tracks ADD PRIMARY KEY {key}",
+        f"CREATE UNIQUE INDEX ON {schema}.playlist_tracks (playlist_id, track_id)",
+        f"CREATE INDEX ON {schema}.playlist_tracks (track_id, playlist_id)",
+    ]
+
+
+async def load(links: int, tracks_per_playlist: int, partitions: int):
+    # Треки внутри плейлиста разные: шаг 7919 по модулю числа треков не повторяется
+    track_count = max(links // 20, 10_007)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for schema in SCHEMAS:
+            for statement in create_statements(schema, partitions):
+                await conn.execute(text(statement))
+            for start in range(0, links, LOAD_BATCH):
+                stop = min(start + LOAD_BATCH, links)
+                await conn.execute(text(f"""
+                    INSERT INTO {schema}.playlist_tracks (id, playlist_id, track_id)
+                    SELECT g, (g - 1) / {tracks_per_playlist} + 1, (g::bigint * 7919) % {track_count} + 1
+                    FROM generate_series({start + 1}, {stop}) AS g
+                """))
+                print(f"{schema}: loaded {stop:,}/{links:,} links", flush=True)
+            for statement in index_statements(schema):
+                await conn.execute(text(statement))
+            await conn.execute(text(f"VACUUM ANALYZE {schema}.playlist_tracks"))
+            print(f"{schema}: indexed", flush=True)
+
+
+def scanned_partitions(plan: dict) -> set[str]:
+    """Секции playlist_tracks, узлы сканирования которых выполнялись хотя бы раз."""
+    scanned = set()
+    if (
+        "Scan" in plan.get("Node Type", "")
+        and plan.get("Relation Name", "").startswith("playlist_tracks")
+        and plan.get("Actual Loops", 0) > 0
+    ):
+        scanned.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        scanned |= scanned_partitions(child)
+    return scanned
+
+
+def cases(max_playlist: int):
+    def playlist():
+        return random.randint(1, max_playlist)
+
+    def playlists(n):
+        return [playlist() for _ in range(n)]
+
+    return {
+        "track ids": lambda: (PLAYLIST_TRACK_IDS, {"playlist_id": playlist()}),
+        "link exists": lambda: (LINK_EXISTS, {"playlist_id": playlist(), "track_id": 1}),
+        "remove link": lambda: (REMOVE_LINK, {"id": 1, "playlist_id": playlist()}),
+        "union of 3": lambda: (text(SET_OPERATION_SOURCES["union"]), {"ids": playlists(3)}),
+        "intersect of 3": lambda: (text(SET_OPERATION_SOURCES["intersect"]), {"ids": playlists(3)}),
+        "difference of 3": lambda: (text(SET_OPERATION_SOURCES["difference"]), {"ids": playlists(3)}),
+    }
+
+
+def literal(value) -> str:
+    if isinstance(value, list):
+        return f"ARRAY[{', '.join(str(int(v)) for v in value)}]::integer[]"
+    return str(int(value))
+
+
+async def explain_generic(conn, statement, params) -> dict:
+    """План generic-версии запроса — такой PostgreSQL использует для
+    подготовленных statement'ов приложения после нескольких выполнений."""
+    compiled = statement.compile(dialect=conn.dialect)
+    values = ", ".join(literal(params[name]) for name in compiled.positiontup)
+    await conn.exec_driver_sql("SET plan_cache_mode = force_generic_plan")
+    await conn.exec_driver_sql(f"PREPARE bench_plan AS {compiled}")
+    try:
+        result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) EXECUTE bench_plan({values})")
+        return result.scalar()[0]["Plan"]
+    finally:
+        await conn.exec_driver_sql("DEALLOCATE bench_plan")
+        await conn.exec_driver_sql("RESET plan_cache_mode")
+
+
+async def measure(schema: str, make, queries: int) -> tuple[float, int]:
+    async with engine.connect() as conn:
+        await conn.execute(text(f"SET search_path = {schema}, public"))
+        for _ in range(10):
+            statement, params = make()
+            await conn.execute(statement, params)
+        timings = []
+        for _ in range(queries):
+            statement, params = make()
+            started = time.perf_counter()
+            await conn.execute(statement, params)
+            timings.append(time.perf_counter() - started)
+
+        plan = await explain_generic(conn, *make())
+        # Удаления из "remove link" не сохраняются
+        await conn.rollback()
+
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, len(scanned_partitions(plan))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark PlaylistService queries on a hash-partitioned playlist_tracks")
+    parser.add_argument("--links", type=int, default=100_000_000)
+    parser.add_argument("--tracks-per-playlist", type=int, default=50)
+    parser.add_argument("--partitions", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--skip-load", action="store_true", help="Use already loaded bench schemas")
+    args = parser.parse_args()
+
+    try:
+        if not args.skip_load:
+            await load(args.links, args.tracks_per_playlist, args.partitions)
+
+        # С --skip-load число плейлистов берётся из уже загруженных данных
+        async with engine.connect() as conn:
+            max_playlist = (await conn.execute(text("SELECT max(playlist_id) FROM bench_plain.playlist_tracks"))).scalar()
+        print(f"\n{'запрос':<18}{'обычная, мс':>14}{'секции':>9}{'хэш, мс':>11}{'секции':>9}")
+        for name, make in cases(max_playlist).items():
+            plain = await measure("bench_plain", make, args.queries)
+            hashed = await measure("bench_hashed", make, args.queries)
+            print(f"{name:<18}{plain[0]:>14.3f}{plain[1]:>9}{hashed[0]:>11.3f}{hashed[1]:>9}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
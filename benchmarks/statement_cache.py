@@ -0,0 +1,130 @@
+"""Накладные расходы на построение запросов: собранные на каждый вызов против готовых.
+
+    python -m benchmarks.statement_cache              # только построение и компиляция
+    python -m benchmarks.statement_cache --database   # плюс полный вызов через AsyncSession
+
+Первый режим не обращается к БД: он повторяет то, что делает Connection перед
+отправкой запроса (сборка select(), ключ кэша, поиск скомпилированного SQL).
+Во втором запросы выполняются по DATABASE_URL, а время считается по CPU процесса,
+чтобы ожидание сети не размывало разницу.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app.database import engine, async_session_maker
+from app.models import Album, Playlist, PlaylistTrack, Track
+from app.services import album_service, playlist_service, track_service
+
+TRACK_ID = 1
+USER_ID = 1
+PLAYLIST_ID = 1
+
+# Пары (запрос в прежнем виде, готовый запрос с параметрами)
+CASES = {
+    "track by id": (
+        lambda: (
+            select(Track).options(joinedload(Track.owner)).where(Track.id == TRACK_ID), {}
+        ),
+        lambda: (track_service.TRACK_BY_ID, {"track_id": TRACK_ID}),
+    ),
+    "user tracks": (
+        lambda: (
+            select(Track).options(joinedload(Track.owner)).where(Track.owner_id == USER_ID), {}
+        ),
+        lambda: (track_service.USER_TRACKS, {"user_id": USER_ID}),
+    ),
+    "user albums": (
+        lambda: (
+            select(Album)
+            .options(joinedload(Album.tracks), joinedload(Album.owner))
+            .where(Album.owner_id == USER_ID),
+            {}
+        ),
+        lambda: (album_service.USER_ALBUMS, {"user_id": USER_ID}),
+    ),
+    "playlist by id": (
+        lambda: (select(Playlist).where(Playlist.id == PLAYLIST_ID), {}),
+        lambda: (playlist_service.PLAYLIST_BY_ID, {"playlist_id": PLAYLIST_ID}),
+    ),
+    "playlist track ids": (
+        lambda: (
+            select(PlaylistTrack.track_id)
+            .where(PlaylistTrack.playlist_id == PLAYLIST_ID)
+            .order_by(PlaylistTrack.id),
+            {}
+        ),
+        lambda: (playlist_service.PLAYLIST_TRACK_IDS, {"playlist_id": PLAYLIST_ID}),
+    ),
+}
+
+
+def compile_overhead(make, iterations: int) -> float:
+    dialect = engine.sync_engine.dialect
+    compiled_cache = {}
+
+    def once():
+        statement, params = make()
+        statement._compile_w_cache(
+            dialect,
+            compiled_cache=compiled_cache,
+            column_keys=sorted(params),
+            for_executemany=False,
+            schema_translate_map=None,
+        )
+
+    for _ in range(100):
+        once()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        once()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def execute_overhead(make, iterations: int) -> float:
+    async with async_session_maker() as db:
+        for _ in range(20):
+            statement, params = make()
+            (await db.execute(statement, params)).unique().all()
+        started = time.process_time()
+        for _ in range(iterations):
+            statement, params = make()
+            (await db.execute(statement, params)).unique().all()
+        return (time.process_time() - started) / iterations * 1e6
+
+
+def report(title: str, results: dict[str, tuple[float, float]]):
+    print(f"\n{title}, мкс на вызов")
+    print(f"{'запрос':<22}{'inline':>10}{'готовый':>10}{'ускорение':>12}")
+    for name, (inline, prepared) in results.items():
+        print(f"{name:<22}{inline:>10.1f}{prepared:>10.1f}{inline / prepared:>11.1f}x")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark statement construction overhead")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--database", action="store_true", help="Also execute queries against DATABASE_URL")
+    args = parser.parse_args()
+
+    report("Построение и компиляция", {
+        name: (compile_overhead(inline, args.iterations), compile_overhead(prepared, args.iterations))
+        for name, (inline, prepared) in CASES.items()
+    })
+
+    if args.database:
+        iterations = max(1, args.iterations // 10)
+        results = {}
+        for name, (inline, prepared) in CASES.items():
+            results[name] = (
+                await execute_overhead(inline, iterations),
+                await execute_overhead(prepared, iterations),
+            )
+        report("Полный вызов через AsyncSession (CPU)", results)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,121 @@
-import uvicorn
+import argparse
+import asyncio
+import importlib.util
+import os
+import random
+
+from uvicorn import Config, Server
+from uvicorn.supervisors import Multiprocess
+
+
+def is_installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MusicApp API production launcher")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        help="Количество воркеров (по умолчанию — число CPU)"
+    )
+    parser.add_argument(
+        "--db-pool-budget", type=int, default=int(os.getenv("DB_POOL_BUDGET", "100")),
+        help="Общее число соединений с БД, которое делится между воркерами"
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", "0")),
+        help="Перезапускать воркер после N запросов (0 — не перезапускать)"
+    )
+    parser.add_argument(
+        "--max-requests-jitter", type=int,
+        default=int(os.environ["MAX_REQUESTS_JITTER"]) if "MAX_REQUESTS_JITTER" in os.environ else None,
+        help="Случайная добавка к --max-requests у каждого воркера (по умолчанию — 10%% от него)"
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        help="Сколько секунд ждать завершения запросов после SIGTERM"
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--access-log", action="store_true", help="Включить access-лог uvicorn")
+    parser.add_argument("--migrate", action="store_true", help="Применить миграции до запуска воркеров")
+    return parser.parse_args()
+
+
+def configure_pool(workers: int, budget: int):
+    # Пул каждого воркера фиксированный: сумма по всем воркерам
+    # не должна превышать бюджет соединений базы
+    os.environ["DB_POOL_SIZE"] = str(max(1, budget // workers))
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+
+
+class RecyclingConfig(Config):
+    """Конфиг, с которым каждый воркер получает свой лимит запросов.
+
+    load() вызывается уже в процессе воркера, поэтому случайная добавка у всех
+    разная и воркеры не перезапускаются одновременно.
+    """
+
+    def __init__(self, *args, max_requests_jitter: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_requests_jitter = max_requests_jitter
+
+    def load(self):
+        super().load()
+        if self.limit_max_requests and self.max_requests_jitter:
+            self.limit_max_requests += random.randint(0, self.max_requests_jitter)
+
+
+def run_migrations():
+    from app.database import engine
+    from app.migrations.runner import migrate
+
+    async def upgrade():
+        try:
+            await migrate(engine)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(upgrade())
+
 
 if __name__ == "__main__":
-    uvicorn.run(
+    args = parse_args()
+    workers = max(1, args.workers)
+    configure_pool(workers, args.db_pool_budget)
+
+    if args.migrate:
+        run_migrations()
+
+    jitter = args.max_requests_jitter
+    if jitter is None:
+        jitter = args.max_requests // 10
+
+    config = RecyclingConfig(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000, 
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop="uvloop" if is_installed("uvloop") else "asyncio",
+        http="httptools" if is_installed("httptools") else "h11",
+        limit_max_requests=args.max_requests or None,
+        max_requests_jitter=max(0, jitter),
+        timeout_graceful_shutdown=args.graceful_timeout,
+        backlog=args.backlog,
+        access_log=args.access_log,
+        proxy_headers=True,
         reload=False
     )
+    server = Server(config=config)
+
+    # Перезапускает завершившийся воркер только супервизор. Без него единственный
+    # воркер с --max-requests после N запросов просто завершился бы
+    if workers > 1 or config.limit_max_requests:
+        sock = config.bind_socket()
+        try:
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        except KeyboardInterrupt:
+            pass
+    else:
+        server.run()